@@ -0,0 +1,146 @@
+"""
+並行延遲測試
+
+啟動一個uvicorn伺服器，在持續上傳檔案的同時以固定間隔查詢 /health/ 與 /data/，
+記錄兩者的p50/p99延遲，確認上傳與慢查詢不會拖慢同一worker上的其他請求。
+
+用法：
+    python benchmarks/concurrency.py --uploads 6 --rows 5000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+from workbooks import synthetic_workbook
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_KEY = "benchmark-key"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentiles(samples: list) -> dict:
+    if not samples:
+        return {"count": 0}
+    values = np.array(samples) * 1000
+    return {
+        "count": len(samples),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "max_ms": round(float(values.max()), 2),
+    }
+
+
+async def probe(client: httpx.AsyncClient, path: str, stop: asyncio.Event, samples: list, interval: float) -> None:
+    headers = {"Authorization": f"Bearer {API_KEY}"}
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get(path, headers=headers)
+        response.raise_for_status()
+        samples.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+
+
+async def upload(client: httpx.AsyncClient, content: bytes, name: str) -> float:
+    started = time.perf_counter()
+    response = await client.post(
+        "/upload/",
+        files={"file": (name, content)},
+        headers={"Authorization": f"Bearer {API_KEY}"},
+    )
+    response.raise_for_status()
+    return time.perf_counter() - started
+
+
+async def run(base_url: str, workbooks: list, interval: float) -> dict:
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        # 先寫入一個檔案，讓 /data/ 有資料可查
+        await upload(client, workbooks[0], "warmup.xlsx")
+
+        idle = {"health": [], "data": []}
+        stop = asyncio.Event()
+        probes = [asyncio.create_task(probe(client, path, stop, idle[name], interval))
+                  for name, path in (("health", "/health/"), ("data", "/data/?limit=50&match=contains&column_name=od"))]
+        await asyncio.sleep(2)
+        stop.set()
+        await asyncio.gather(*probes)
+
+        busy = {"health": [], "data": []}
+        stop = asyncio.Event()
+        probes = [asyncio.create_task(probe(client, path, stop, busy[name], interval))
+                  for name, path in (("health", "/health/"), ("data", "/data/?limit=50&match=contains&column_name=od"))]
+        started = time.perf_counter()
+        upload_seconds = await asyncio.gather(*[
+            upload(client, content, f"upload_{i}.xlsx") for i, content in enumerate(workbooks[1:])
+        ])
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await asyncio.gather(*probes)
+
+    return {
+        "uploads": len(upload_seconds),
+        "upload_wall_seconds": round(elapsed, 3),
+        "upload_p50_seconds": round(float(np.percentile(upload_seconds, 50)), 3),
+        "idle": {name: percentiles(samples) for name, samples in idle.items()},
+        "during_uploads": {name: percentiles(samples) for name, samples in busy.items()},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="上傳期間的讀取延遲測試")
+    parser.add_argument("--uploads", type=int, default=6)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--cols", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=0.02, help="每個探測請求之間的秒數")
+    args = parser.parse_args()
+
+    workbooks = [synthetic_workbook(args.rows, args.cols, sheets=2, seed=seed) for seed in range(args.uploads + 1)]
+
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    port = free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=os.getenv("DATABASE_URL", f"sqlite:///{workdir}/bench.db"),
+        API_KEY=API_KEY,
+        ALLOWED_HOSTS="127.0.0.1,localhost",
+        RATE_LIMIT_REQUESTS="1000000",
+        RESPONSE_CACHE_SIZE="0",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "secure_main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):
+            try:
+                if httpx.get(f"{base_url}/health/").status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            time.sleep(0.1)
+        result = asyncio.run(run(base_url, workbooks, args.interval))
+    finally:
+        server.terminate()
+        server.wait()
+
+    result.update({"rows": args.rows, "cols": args.cols, "database": env["DATABASE_URL"].split(":")[0]})
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
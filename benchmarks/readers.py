@@ -0,0 +1,94 @@
+"""
+Excel讀取後端效能測試
+
+產生含多個工作表的測試工作簿（數值、整數、日期、文字混合），以各個可用的讀取後端
+（pandas預設、openpyxl values_only、calamine）解析全部工作表，並比較程序池平行解析
+的效果。openpyxl後端先確認結果與pd.read_excel一致（calamine的型別轉換不同，
+只比對形狀），再記錄最佳耗時。
+
+用法：
+    python benchmarks/readers.py --rows 20000 --sheets 4 --processes 4
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import readers  # noqa: E402
+from workbooks import synthetic_workbook  # noqa: E402
+
+
+def parse_all(path: str, reader: str, pool) -> dict:
+    with readers.Workbook(path, reader, pool) as book:
+        return {sheet_name: frame for sheet_name, load in book.sheets() for frame in load()}
+
+
+def measure(path: str, reader: str, processes: int, pool, expected: dict, repeat: int) -> dict:
+    frames = parse_all(path, reader, pool)
+    for sheet_name, df in expected.items():
+        if reader == "calamine":
+            assert frames[sheet_name].shape == df.shape
+        else:
+            pd.testing.assert_frame_equal(frames[sheet_name], df)
+    cells = sum(df.size for df in frames.values())
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        parse_all(path, reader, pool)
+        timings.append(time.perf_counter() - started)
+    best = min(timings)
+    return {
+        "reader": readers.resolve_reader(path, reader),
+        "processes": processes,
+        "seconds": round(best, 3),
+        "cells_per_second": round(cells / best, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Excel讀取後端效能測試")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--cols", type=int, default=4, help="每個工作表的量測欄位數")
+    parser.add_argument("--sheets", type=int, default=4)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    path = os.path.join(workdir, "workbook.xlsx")
+    with open(path, "wb") as f:
+        f.write(synthetic_workbook(args.rows, args.cols, args.sheets))
+    file_bytes = os.path.getsize(path)
+
+    with pd.ExcelFile(path) as excel_file:
+        expected = {name: excel_file.parse(name) for name in excel_file.sheet_names}
+
+    candidates = ["pandas", "openpyxl"]
+    if readers.calamine_available():
+        candidates.append("calamine")
+
+    results = [measure(path, reader, 0, None, expected, args.repeat) for reader in candidates]
+    if args.processes > 0:
+        with ProcessPoolExecutor(max_workers=args.processes) as pool:
+            results += [measure(path, reader, args.processes, pool, expected, args.repeat) for reader in candidates]
+
+    os.remove(path)
+    print(json.dumps({
+        "rows": args.rows,
+        "sheets": args.sheets,
+        "file_bytes": file_bytes,
+        "runs": results,
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+測試用的合成培養紀錄工作簿
+
+各效能測試共用的產生器：每個工作表模擬一座光生物反應器的連續量測紀錄
+（時間、反應器編號、OD680/OD750、pH、溫度、光照等），可調整列數、欄數、
+工作表數、缺值比例，以及是否加入文字、布林與混合型別的欄位。相同參數與
+seed產生相同內容。
+
+.xlsx由openpyxl寫入；.xls需要安裝xlwt（pandas已不支援寫入xls）。
+"""
+
+import io
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+# 量測欄位名稱（欄數超過時加上編號）
+MEASUREMENTS = ("od680", "od750", "ph", "temperature", "light", "dissolved_o2", "co2", "conductivity")
+FORMATS = ("xlsx", "xls")
+
+
+def measurement_names(count: int) -> List[str]:
+    names = []
+    for position in range(count):
+        name = MEASUREMENTS[position % len(MEASUREMENTS)]
+        round_ = position // len(MEASUREMENTS)
+        names.append(f"{name}_{round_}" if round_ else name)
+    return names
+
+
+def culture_log_frame(rows: int, columns: int = 8, seed: int = 0, null_density: float = 0.05,
+                      mixed: bool = True) -> pd.DataFrame:
+    """產生一個工作表的資料（columns為量測欄位數，另有時間與反應器編號）"""
+    rng = np.random.default_rng(seed)
+    data = {
+        "time": pd.date_range("2024-01-01", periods=rows, freq="10min"),
+        "reactor": rng.integers(1, 9, size=rows),
+    }
+    for name in measurement_names(columns):
+        values = rng.normal(loc=rng.uniform(0.5, 30), scale=rng.uniform(0.05, 2), size=rows)
+        values[rng.random(rows) < null_density] = np.nan
+        data[name] = values
+
+    if mixed:
+        # 人工紀錄：多數為空的文字、布林旗標，以及數值中夾雜文字的欄位
+        data["note"] = np.where(rng.random(rows) < 0.9, None, rng.choice(["sampled", "diluted", "contaminated?"], rows))
+        data["harvested"] = rng.random(rows) < 0.1
+        manual = rng.normal(1.2, 0.3, rows).round(3).astype(object)
+        manual[rng.random(rows) < 0.05] = "n/a"
+        manual[rng.random(rows) < null_density] = None
+        data["manual_od"] = manual
+    return pd.DataFrame(data)
+
+
+def synthetic_workbook(rows: int, columns: int = 8, sheets: int = 2, seed: int = 0,
+                       null_density: float = 0.05, mixed: bool = True, format: str = "xlsx") -> bytes:
+    """產生整個工作簿的檔案內容"""
+    if format not in FORMATS:
+        raise ValueError(f"不支援的格式: {format}")
+    frames = {
+        f"reactor_{sheet + 1}": culture_log_frame(rows, columns, seed * 1000 + sheet, null_density, mixed)
+        for sheet in range(sheets)
+    }
+    if format == "xls":
+        return _write_xls(frames)
+
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        for sheet_name, df in frames.items():
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+    return buffer.getvalue()
+
+
+def _write_xls(frames: dict) -> bytes:
+    try:
+        import xlwt
+    except ImportError:
+        raise RuntimeError("產生 .xls 測試檔需要安裝 xlwt 套件")
+    if any(len(df) >= 65536 for df in frames.values()):
+        raise ValueError(".xls 每個工作表最多 65535 列資料")
+
+    date_style = xlwt.easyxf(num_format_str="yyyy-mm-dd hh:mm:ss")
+    book = xlwt.Workbook()
+    for sheet_name, df in frames.items():
+        sheet = book.add_sheet(sheet_name)
+        for col, name in enumerate(df.columns):
+            sheet.write(0, col, name)
+        for col, name in enumerate(df.columns):
+            is_time = df[name].dtype.kind == "M"
+            for row, value in enumerate(df[name].tolist(), start=1):
+                if value is None or (isinstance(value, float) and np.isnan(value)):
+                    continue
+                if is_time:
+                    sheet.write(row, col, value.to_pydatetime(), date_style)
+                else:
+                    sheet.write(row, col, value.item() if isinstance(value, np.generic) else value)
+    buffer = io.BytesIO()
+    book.save(buffer)
+    return buffer.getvalue()
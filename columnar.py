@@ -0,0 +1,155 @@
+"""
+工作表寬表儲存
+
+每個工作表存成一張具型別欄位的資料表（一列對應Excel的一列），讀取整列或
+整欄只需一次循序掃描。欄位以位置命名（c0, c1, ...），原始欄名與型別記錄在
+欄位描述中，避免Excel欄名與資料庫識別字的長度、大小寫與字元限制衝突。
+"""
+
+from graphlib import TopologicalSorter
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Float, Integer, MetaData, Table, Text, select
+from sqlalchemy.orm import Session
+
+# dtype種類 -> (欄位型別名稱, SQLAlchemy型別)
+_WIDE_TYPES = {
+    "i": ("int", BigInteger),
+    "u": ("int", BigInteger),
+    "f": ("float", Float),
+    "b": ("bool", Boolean),
+    "M": ("datetime", DateTime),
+}
+_SQL_TYPES = {name: sql_type for name, sql_type in _WIDE_TYPES.values()}
+_SQL_TYPES["text"] = Text
+
+
+def wide_table_name(file_id: int, sheet_index: int) -> str:
+    return f"sheet_{file_id}_{sheet_index}"
+
+
+def describe_columns(df: pd.DataFrame) -> List[Dict[str, str]]:
+    """產生欄位描述：[{"name": 原始欄名, "column": 資料庫欄名, "type": 型別}]"""
+    columns = []
+    for position, (name, dtype) in enumerate(df.dtypes.items()):
+        type_name = _WIDE_TYPES.get(dtype.kind, ("text", Text))[0]
+        columns.append({"name": str(name), "column": f"c{position}", "type": type_name})
+    return columns
+
+
+def wide_table(table_name: str, columns: Sequence[Dict[str, str]]) -> Table:
+    """依欄位描述建立Table物件（不屬於應用程式的MetaData）"""
+    return Table(
+        table_name,
+        MetaData(),
+        Column("row_number", Integer, primary_key=True),
+        *[Column(col["column"], _SQL_TYPES[col["type"]]) for col in columns]
+    )
+
+
+def _column_values(series: pd.Series, type_name: str) -> List[Any]:
+    """將一欄轉為可寫入的Python值（空值為None）"""
+    mask = series.notna().to_numpy()
+    if type_name == "datetime":
+        if series.dt.tz is not None:
+            series = series.dt.tz_convert("UTC").dt.tz_localize(None)
+        values = np.array(series.dt.to_pydatetime(), dtype=object)
+    elif type_name == "text":
+        values = series.to_numpy(dtype=object, na_value=None)
+        values[mask] = [str(value) for value in values[mask]]
+    else:
+        values = series.to_numpy(dtype=object)
+    values[~mask] = None
+    return values.tolist()
+
+
+def iter_wide_records(df: pd.DataFrame, columns: Sequence[Dict[str, str]]) -> Iterator[Dict[str, Any]]:
+    """將工作表轉為寬表寫入用的字典（每列一筆）"""
+    keys = ["row_number"] + [col["column"] for col in columns]
+    arrays = [(np.asarray(df.index) + 1).tolist()]
+    arrays += [_column_values(df.iloc[:, position], col["type"]) for position, col in enumerate(columns)]
+    for values in zip(*arrays):
+        yield dict(zip(keys, values))
+
+
+def create_wide_table(db: Session, table_name: str, df: pd.DataFrame) -> Table:
+    """建立寬表（沿用呼叫端的交易），回傳Table物件；欄位描述可由describe_columns取得"""
+    table = wide_table(table_name, describe_columns(df))
+    table.create(db.connection())
+    return table
+
+
+def read_wide_frame(db: Session, table_name: str, columns: Sequence[Dict[str, str]],
+                    names: Optional[Sequence[str]] = None, row_from: Optional[int] = None,
+                    row_to: Optional[int] = None) -> pd.DataFrame:
+    """讀取寬表為DataFrame（以Excel列號為索引、原始欄名為欄位），可選擇欄位與列範圍"""
+    table = wide_table(table_name, columns)
+    selected = [col for col in columns if names is None or col["name"] in names]
+    statement = select(table.c.row_number, *[table.c[col["column"]] for col in selected])
+    if row_from is not None:
+        statement = statement.where(table.c.row_number >= row_from)
+    if row_to is not None:
+        statement = statement.where(table.c.row_number <= row_to)
+    statement = statement.order_by(table.c.row_number)
+
+    rows = db.execute(statement).all()
+    df = pd.DataFrame(rows, columns=["row_number"] + [col["name"] for col in selected])
+    return df.set_index("row_number")
+
+
+def _column_order(cells: pd.DataFrame) -> List[int]:
+    """由寫入順序還原工作表的欄位順序
+
+    儲存格依列優先順序寫入，同一列中相鄰的兩格即表示兩欄的前後關係；
+    以此做拓撲排序，沒有前後關係可循時依各欄最早寫入的id排列。
+    """
+    ordered = cells.sort_values("id")
+    first_id = ordered.groupby("column_id", sort=False)["id"].first().to_dict()
+    same_row = ordered["row_number"].to_numpy()[1:] == ordered["row_number"].to_numpy()[:-1]
+    column_ids = ordered["column_id"].to_numpy()
+    edges = set(zip(column_ids[:-1][same_row].tolist(), column_ids[1:][same_row].tolist()))
+
+    sorter = TopologicalSorter({column_id: set() for column_id in first_id})
+    for before, after in edges:
+        sorter.add(after, before)
+    sorter.prepare()
+    order: List[int] = []
+    ready: List[int] = []
+    while sorter.is_active():
+        ready = sorted(set(ready) | set(sorter.get_ready()), key=first_id.get)
+        column_id = ready.pop(0)
+        order.append(column_id)
+        sorter.done(column_id)
+    return order
+
+
+def pivot_cells(cells: pd.DataFrame, column_names: Dict[int, str], type_names: Dict[int, str]) -> pd.DataFrame:
+    """將每格一筆的資料（id, row_number, column_id, cell_value, type_id）轉回表格
+
+    全為int或int/float的欄位還原為數值，其餘維持字串；全為空值的列沒有儲存格，
+    不會出現在結果中。回傳以Excel列號為索引的DataFrame。
+    """
+    if cells.empty:
+        return pd.DataFrame(index=pd.Index([], name="row_number", dtype="int64"))
+
+    order = _column_order(cells)
+    table = cells.pivot(index="row_number", columns="column_id", values="cell_value")
+    table = table.reindex(columns=order).sort_index()
+
+    kinds = cells["type_id"].map(type_names).groupby(cells["column_id"]).unique()
+    for column_id in order:
+        column_kinds = set(kinds[column_id])
+        if column_kinds == {"int"}:
+            table[column_id] = pd.to_numeric(table[column_id]).astype("Int64")
+        elif column_kinds <= {"int", "float"}:
+            table[column_id] = pd.to_numeric(table[column_id])
+
+    table.columns = [column_names[column_id] for column_id in order]
+    table.index.name = "row_number"
+    return table
+
+
+def drop_wide_table(db: Session, table_name: str) -> None:
+    Table(table_name, MetaData()).drop(db.connection(), checkfirst=True)
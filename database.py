@@ -0,0 +1,119 @@
+"""
+資料庫連線設定
+
+依DATABASE_URL的後端套用對應的連線池與連線參數：
+- SQLite：WAL模式（讀取不會被寫入阻擋）、busy_timeout與適合本服務的pragma
+- PostgreSQL等伺服器資料庫：連線池大小、溢出上限、pre-ping與定期回收
+
+同一個資料庫另有非同步引擎（aiosqlite / asyncpg），供讀取端點在事件迴圈中
+等待查詢而不阻塞其他請求。
+
+PostgreSQL驅動（psycopg2、asyncpg）為選用套件：pip install -r requirements-postgres.txt
+"""
+
+import os
+from contextlib import contextmanager
+from typing import Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+# 連線池設定（伺服器資料庫）
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # 等待可用連線的秒數
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # 連線使用超過此秒數後重建
+
+# 同步驅動 -> 非同步驅動
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+# 未指定驅動的 postgresql:// 使用psycopg2（SQLAlchemy 2.1起預設改為psycopg 3，需明確指定）
+DEFAULT_SYNC_DRIVERS = {"postgresql": "psycopg2"}
+
+# SQLite設定
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "30000"))  # 等待寫入鎖的毫秒數
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))  # 每個連線的頁面快取
+
+
+def normalize_database_url(url: str) -> str:
+    """Render等平台提供的 postgres:// 改為SQLAlchemy使用的 postgresql://，未指定驅動時套用預設驅動"""
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    parsed = make_url(url)
+    if "+" not in parsed.drivername and parsed.drivername in DEFAULT_SYNC_DRIVERS:
+        backend = parsed.drivername
+        return parsed.set(drivername=f"{backend}+{DEFAULT_SYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+    return url
+
+
+def async_database_url(url: str) -> str:
+    """由同步連線網址推得非同步驅動的網址（例如 sqlite:// -> sqlite+aiosqlite://）"""
+    parsed = make_url(normalize_database_url(url))
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f"資料庫 {backend} 沒有對應的非同步驅動，請設定 ASYNC_DATABASE_URL")
+    return parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+def create_database_engine(url: str) -> Engine:
+    url = normalize_database_url(url)
+    backend = make_url(url).get_backend_name()
+    if backend == "sqlite":
+        engine = create_engine(url, connect_args={"check_same_thread": False})
+        _set_sqlite_pragmas(engine, url)
+        return engine
+    with _driver_required(url):
+        return create_engine(url, **_pool_options())
+
+
+def create_async_database_engine(url: str, async_url: Optional[str] = None) -> AsyncEngine:
+    """建立非同步引擎；未指定async_url時由url推得"""
+    async_url = async_url or async_database_url(url)
+    if make_url(async_url).get_backend_name() == "sqlite":
+        engine = create_async_engine(async_url)
+        _set_sqlite_pragmas(engine.sync_engine, async_url)
+        return engine
+    with _driver_required(async_url):
+        return create_async_engine(async_url, **_pool_options())
+
+
+@contextmanager
+def _driver_required(url: str):
+    """資料庫驅動未安裝時改為說明安裝方式的錯誤"""
+    try:
+        yield
+    except ModuleNotFoundError as e:
+        parsed = make_url(url)
+        hint = "pip install -r requirements-postgres.txt" if parsed.get_backend_name() == "postgresql" else f"安裝 {e.name} 套件"
+        raise RuntimeError(f"資料庫驅動 {parsed.drivername} 未安裝（{e.name}），請執行 {hint}") from e
+
+
+def _pool_options() -> dict:
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def _set_sqlite_pragmas(engine: Engine, url: str) -> None:
+    database = make_url(url).database
+    in_memory = database in (None, "", ":memory:")
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            if not in_memory:
+                # WAL：讀取者讀取快照，不會被進行中的上傳阻擋；寫入者彼此仍需排隊
+                cursor.execute("PRAGMA journal_mode=WAL")
+                # WAL模式下NORMAL仍可保證資料庫一致，只在斷電時可能遺失最後的交易
+                cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+            cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+        finally:
+            cursor.close()
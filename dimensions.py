@@ -0,0 +1,96 @@
+"""
+維度表（名稱 -> 整數ID）的程序內快取
+
+工作表名稱、欄位名稱與資料型別各自存放在只增不減的小型維度表中，
+儲存格資料只記錄整數ID。寫入時先查快取，未命中者才查詢或新增資料列。
+新解析出的ID在交易提交後才放入快取，避免交易回滾後留下不存在的ID。
+"""
+
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import Table, event, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+_PENDING_KEY = "dimension_pending"
+_LOOKUP_CHUNK = 500
+
+
+class DimensionCache:
+    """單一維度表（id, name）的名稱對照快取"""
+
+    def __init__(self, table: Table):
+        self.table = table
+        self._ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, db: Session, names: Iterable[str]) -> Dict[str, int]:
+        """取得名稱對應的ID，不存在的名稱會在目前交易中新增"""
+        wanted = set(names)
+        with self._lock:
+            result = {name: self._ids[name] for name in wanted if name in self._ids}
+        missing = wanted - result.keys()
+        if not missing:
+            return result
+
+        found = self._load(db, missing)
+        new_names = missing - found.keys()
+        if new_names:
+            db.execute(_insert_ignore(db, self.table), [{"name": name} for name in sorted(new_names)])
+            found.update(self._load(db, new_names))
+        result.update(found)
+
+        db.info.setdefault(_PENDING_KEY, []).append((self, found))
+        return result
+
+    def name_of(self, db: Session, ids: Iterable[int]) -> Dict[int, str]:
+        """由ID反查名稱"""
+        ids = set(ids)
+        with self._lock:
+            known = {id_: name for name, id_ in self._ids.items() if id_ in ids}
+        missing = list(ids - known.keys())
+        for start in range(0, len(missing), _LOOKUP_CHUNK):
+            chunk = missing[start:start + _LOOKUP_CHUNK]
+            rows = db.execute(select(self.table.c.id, self.table.c.name).where(self.table.c.id.in_(chunk)))
+            known.update({id_: name for id_, name in rows})
+        return known
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ids.clear()
+
+    def _load(self, db: Session, names: Iterable[str]) -> Dict[str, int]:
+        names = list(names)
+        found: Dict[str, int] = {}
+        for start in range(0, len(names), _LOOKUP_CHUNK):
+            chunk = names[start:start + _LOOKUP_CHUNK]
+            rows = db.execute(select(self.table.c.name, self.table.c.id).where(self.table.c.name.in_(chunk)))
+            found.update({name: id_ for name, id_ in rows})
+        return found
+
+    def _promote(self, mapping: Dict[str, int]) -> None:
+        with self._lock:
+            self._ids.update(mapping)
+
+
+def _insert_ignore(db: Session, table: Table):
+    """新增資料列，名稱已存在（例如其他worker同時新增）時略過"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        return sqlite.insert(table).on_conflict_do_nothing(index_elements=["name"])
+    if dialect == "postgresql":
+        return postgresql.insert(table).on_conflict_do_nothing(index_elements=["name"])
+    return insert(table)
+
+
+@event.listens_for(Session, "after_commit")
+def _promote_pending(session: Session) -> None:
+    pending: List[Tuple[DimensionCache, Dict[str, int]]] = session.info.pop(_PENDING_KEY, [])
+    for cache, mapping in pending:
+        cache._promote(mapping)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(session: Session, previous_transaction) -> None:
+    session.info.pop(_PENDING_KEY, None)
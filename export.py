@@ -0,0 +1,212 @@
+"""
+資料匯出的串流輸出
+
+查詢結果以批次（yield_per）逐批讀出，每批由編碼器轉成對應格式後立即送出，
+記憶體用量只與批次大小有關，與匯出筆數無關。Parquet與Arrow格式需要pyarrow。
+"""
+
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, List, Sequence
+
+import pandas as pd
+
+EXPORT_FIELDS = ("filename", "sheet_name", "row_number", "column_name", "cell_value", "data_type", "upload_time")
+
+# 格式 -> (Content-Type, 副檔名)
+EXPORT_FORMATS = {
+    "json": ("application/json", "json"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+}
+ARROW_FORMATS = ("parquet", "arrow")
+
+
+def require_pyarrow():
+    """匯入pyarrow，未安裝時丟出RuntimeError"""
+    try:
+        import pyarrow
+    except ImportError:
+        raise RuntimeError("parquet/arrow 匯出需要安裝 pyarrow 套件")
+    return pyarrow
+
+
+def _record(row: Sequence[Any]) -> dict:
+    record = dict(zip(EXPORT_FIELDS, row))
+    if isinstance(record["upload_time"], datetime):
+        record["upload_time"] = record["upload_time"].isoformat()
+    return record
+
+
+class _JsonEncoder:
+    """與舊版相同的 {"data": [...]} 結構"""
+
+    def __init__(self):
+        self._first = True
+
+    def start(self) -> bytes:
+        return b'{"data":['
+
+    def encode(self, batch: List[Sequence[Any]]) -> bytes:
+        chunk = ",".join(json.dumps(_record(row), ensure_ascii=False) for row in batch)
+        if not self._first:
+            chunk = "," + chunk
+        self._first = False
+        return chunk.encode("utf-8")
+
+    def finish(self) -> bytes:
+        return b"]}"
+
+
+class _NdjsonEncoder:
+    """每行一筆JSON"""
+
+    def start(self) -> bytes:
+        return b""
+
+    def encode(self, batch: List[Sequence[Any]]) -> bytes:
+        return "".join(json.dumps(_record(row), ensure_ascii=False) + "\n" for row in batch).encode("utf-8")
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class _CsvEncoder:
+    """CSV（含標題列，UTF-8 BOM讓Excel正確辨識中文）"""
+
+    def __init__(self):
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+
+    def start(self) -> bytes:
+        self._writer.writerow(EXPORT_FIELDS)
+        return ("\ufeff" + self._take()).encode("utf-8")
+
+    def encode(self, batch: List[Sequence[Any]]) -> bytes:
+        self._writer.writerows(_record(row).values() for row in batch)
+        return self._take().encode("utf-8")
+
+    def finish(self) -> bytes:
+        return b""
+
+    def _take(self) -> str:
+        value = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return value
+
+
+class _ChunkSink(io.RawIOBase):
+    """只寫入的檔案物件，寫入的內容可隨時取出送出"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def _arrow_schema(pa):
+    return pa.schema([
+        ("filename", pa.string()),
+        ("sheet_name", pa.string()),
+        ("row_number", pa.int64()),
+        ("column_name", pa.string()),
+        ("cell_value", pa.string()),
+        ("data_type", pa.string()),
+        ("upload_time", pa.timestamp("us")),
+    ])
+
+
+class _ArrowEncoder:
+    """Parquet（每批一個row group）或Arrow IPC串流"""
+
+    def __init__(self, format: str):
+        self._pa = require_pyarrow()
+        self._format = format
+        self._schema = _arrow_schema(self._pa)
+        self._sink = _ChunkSink()
+        self._writer = None
+
+    def start(self) -> bytes:
+        if self._format == "parquet":
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(self._sink, self._schema)
+        else:
+            self._writer = self._pa.ipc.new_stream(self._sink, self._schema)
+        return self._sink.take()
+
+    def encode(self, batch: List[Sequence[Any]]) -> bytes:
+        columns = list(zip(*batch))
+        arrays = [self._pa.array(values, type=field.type) for values, field in zip(columns, self._schema)]
+        self._writer.write_batch(self._pa.record_batch(arrays, schema=self._schema))
+        return self._sink.take()
+
+    def finish(self) -> bytes:
+        self._writer.close()
+        return self._sink.take()
+
+
+def export_encoder(format: str):
+    """依格式建立編碼器（start/encode/finish各回傳要送出的位元組）"""
+    if format == "json":
+        return _JsonEncoder()
+    if format == "ndjson":
+        return _NdjsonEncoder()
+    if format == "csv":
+        return _CsvEncoder()
+    if format in ARROW_FORMATS:
+        return _ArrowEncoder(format)
+    raise ValueError(f"不支援的匯出格式: {format}")
+
+
+async def stream_export(batches: AsyncIterator[List[Sequence[Any]]], format: str) -> AsyncIterator[bytes]:
+    """依格式逐批產生輸出內容；batches為 EXPORT_FIELDS 順序的資料列批次"""
+    encoder = export_encoder(format)
+    yield encoder.start()
+    async for batch in batches:
+        if batch:
+            chunk = encoder.encode(batch)
+            if chunk:
+                yield chunk
+    chunk = encoder.finish()
+    if chunk:
+        yield chunk
+
+
+def frame_rows(df: pd.DataFrame) -> List[List[Any]]:
+    """表格轉為JSON列（第一個值為列號，空值為None）"""
+    values = df.astype(object).where(df.notna(), None)
+    return [[row_number] + list(row) for row_number, row in zip(df.index.tolist(), values.itertuples(index=False, name=None))]
+
+
+def encode_frame(df: pd.DataFrame, format: str) -> bytes:
+    """將以列號為索引的表格編碼為csv或Arrow IPC串流"""
+    if format == "csv":
+        return ("\ufeff" + df.to_csv()).encode("utf-8")
+    if format == "arrow":
+        pa = require_pyarrow()
+        table = pa.Table.from_pandas(df.reset_index(), preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    raise ValueError(f"不支援的表格格式: {format}")
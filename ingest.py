@@ -0,0 +1,280 @@
+"""
+Excel資料批次寫入引擎
+
+將工作表DataFrame以向量化方式展開為長格式（每個非空儲存格一筆），
+再以Core層級的executemany分批寫入資料庫，取代逐格建立ORM物件。
+數值與時間儲存格另外填入value_num / value_time，供資料庫直接篩選與彙總。
+PostgreSQL則改用 COPY FROM STDIN 串流寫入。
+"""
+
+import io
+import logging
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Table
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# 寫入設定
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "5000"))  # 每批寫入筆數
+INGEST_TARGET_CELLS_PER_SEC = float(os.getenv("INGEST_TARGET_CELLS_PER_SEC", "25000"))  # 吞吐量目標（展開+寫入，不含解析）
+INGEST_TARGET_MIN_CELLS = int(os.getenv("INGEST_TARGET_MIN_CELLS", "50000"))  # 達到此儲存格數才與目標比較（小檔案以固定成本為主）
+INGEST_METHOD = os.getenv("INGEST_METHOD", "auto")  # auto（PostgreSQL使用COPY，其餘executemany）或 insert
+MAX_CELL_LENGTH = 1000
+
+# 填入value_num與value_time的型別名稱（bool不視為數值）
+NUMERIC_TYPES = ("int", "float")
+TIME_TYPES = ("Timestamp", "datetime")
+
+# 整數與布林陣列的型別名稱可由dtype直接推得
+_NUMERIC_TYPE_NAMES = {"b": "bool", "i": "int", "u": "int"}
+_to_str = np.frompyfunc(str, 1, 1)
+_type_name = np.frompyfunc(lambda value: type(value).__name__, 1, 1)
+
+
+def _normalize_value(value):
+    """單一儲存格的值轉為與欄位型別無關的形式：numpy純量轉為Python值、
+    整數值的浮點數轉為int（與讀取器的轉換一致）、datetime轉為Timestamp"""
+    if isinstance(value, np.datetime64):
+        return pd.Timestamp(value)
+    if isinstance(value, np.generic):
+        value = value.item()
+    if type(value) is float and value.is_integer():
+        return int(value)
+    if type(value) is datetime:
+        return pd.Timestamp(value)
+    return value
+
+
+_normalize = np.frompyfunc(_normalize_value, 1, 1)
+
+
+def _float_cells(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """浮點數欄位：整數值的儲存格視為int，其餘維持float"""
+    integral = np.isfinite(values) & (np.mod(values, 1) == 0)
+    cell_value = values.astype(str).astype(object)
+    data_type = np.where(integral, "int", "float").astype(object)
+    cells = values.astype(object)
+    small = integral & (np.abs(values) < 2 ** 63)
+    cell_value[small] = values[small].astype(np.int64).astype(str)
+    for position in np.flatnonzero(integral & ~small):
+        cells[position] = int(values[position])
+        cell_value[position] = str(cells[position])
+    return cells, cell_value, data_type
+
+
+def _column_cells(values: np.ndarray, kind: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """將一個欄位的非空值轉為（值, 文字, 型別名稱）"""
+    type_name = _NUMERIC_TYPE_NAMES.get(kind)
+    if type_name is not None:
+        return values, values.astype(str).astype(object), np.full(len(values), type_name, dtype=object)
+    if kind == "f":
+        return _float_cells(values)
+    cells = _normalize(values)
+    return cells, _to_str(cells), _type_name(cells)
+
+
+def frame_to_cells(df: pd.DataFrame) -> pd.DataFrame:
+    """將工作表展開為長格式（列優先順序，只保留非空值）
+
+    每個儲存格的文字與型別只由自身的值決定，不受同欄或同一段其他列的型別推斷影響，
+    因此串流讀取時不論INGEST_CHUNK_ROWS如何分段，寫入的儲存格都相同：
+    整數值的浮點數為int、datetime為Timestamp。儲存格文字超過長度限制時截斷。
+    """
+    mask = df.notna().to_numpy()
+    grids = [np.empty(mask.shape, dtype=object) for _ in range(3)]
+    for position, (_, column) in enumerate(df.items()):
+        keep = mask[:, position]
+        if keep.any():
+            kind = column.dtype.kind
+            values = (column.astype(object) if kind in "mM" else column).to_numpy()[keep]
+            for grid, part in zip(grids, _column_cells(values, kind)):
+                grid[keep, position] = part
+
+    row_pos, col_pos = np.nonzero(mask)
+    cells, cell_value, data_type = (grid[row_pos, col_pos] for grid in grids)
+    value_num, value_time = _typed_values(cells, data_type)
+
+    if len(cell_value):
+        too_long = pd.Series(cell_value).str.len().to_numpy() > MAX_CELL_LENGTH
+        if too_long.any():
+            cell_value[too_long] = [text[:MAX_CELL_LENGTH] + "..." for text in cell_value[too_long]]
+
+    row_numbers = np.asarray(df.index) + 1
+    column_names = np.array([str(col) for col in df.columns], dtype=object)
+
+    return pd.DataFrame({
+        "row_number": row_numbers[row_pos],
+        "column_name": column_names[col_pos],
+        "cell_value": cell_value,
+        "data_type": data_type,
+        # 保持object型別，空值維持None而不會被轉為NaN/NaT
+        "value_num": pd.Series(value_num, dtype=object),
+        "value_time": pd.Series(value_time, dtype=object),
+    })
+
+
+def _typed_values(cells: np.ndarray, data_type: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """依型別名稱取出數值與時間（其餘為None）；時區時間轉為UTC後去除時區"""
+    value_num = np.full(len(cells), None, dtype=object)
+    value_time = np.full(len(cells), None, dtype=object)
+
+    is_num = np.isin(data_type, NUMERIC_TYPES)
+    if is_num.any():
+        numbers = cells[is_num].astype(float)
+        finite = np.isfinite(numbers)
+        is_num[is_num] = finite
+        value_num[is_num] = numbers[finite]
+
+    is_time = np.isin(data_type, TIME_TYPES)
+    if is_time.any():
+        times = pd.DatetimeIndex(pd.to_datetime(cells[is_time], utc=True)).tz_localize(None)
+        value_time[is_time] = times.to_pydatetime()
+    return value_num, value_time
+
+
+def parse_typed_value(cell_value: str, data_type: str) -> Tuple[Optional[float], Optional[datetime]]:
+    """由已儲存的文字還原value_num / value_time（回填舊資料用）"""
+    try:
+        if data_type in NUMERIC_TYPES:
+            number = float(cell_value)
+            return (number if np.isfinite(number) else None), None
+        if data_type in TIME_TYPES:
+            timestamp = pd.Timestamp(cell_value)
+            if timestamp.tzinfo is not None:
+                timestamp = timestamp.tz_convert("UTC").tz_localize(None)
+            return None, timestamp.to_pydatetime()
+    except (TypeError, ValueError):
+        pass
+    return None, None
+
+
+def row_fingerprints(cells: pd.DataFrame) -> pd.Series:
+    """每一列的指紋（row_number -> int64），用於增量寫入時比對列是否變更
+
+    由該列每個儲存格的欄位名稱、文字與型別雜湊後加總，與欄位順序無關；
+    沒有任何非空儲存格的列不會出現在結果中。
+    """
+    if cells.empty:
+        return pd.Series(dtype="int64")
+    hashes = pd.util.hash_pandas_object(cells[["column_name", "cell_value", "data_type"]], index=False)
+    # uint64加總溢位時自然取模，轉為資料庫可存放的有號整數
+    sums = hashes.groupby(cells["row_number"].to_numpy()).sum()
+    return pd.Series(sums.to_numpy().view(np.int64), index=sums.index)
+
+
+def encode_cells(cells: pd.DataFrame, column_ids: Dict[str, int], type_ids: Dict[str, int]) -> pd.DataFrame:
+    """將長格式中的欄位名稱與型別名稱換成維度表ID"""
+    return pd.DataFrame({
+        "row_number": cells["row_number"],
+        "column_id": cells["column_name"].map(column_ids),
+        "cell_value": cells["cell_value"],
+        "type_id": cells["data_type"].map(type_ids),
+        "value_num": cells["value_num"],
+        "value_time": cells["value_time"],
+    })
+
+
+def iter_cell_records(cells: pd.DataFrame, **constants: Any) -> Iterator[Dict[str, Any]]:
+    """將長格式資料轉為寫入用的字典，並附上每筆相同的欄位（檔名、雜湊值等）"""
+    columns = list(cells.columns)
+    arrays = [cells[col].tolist() for col in columns]
+    for values in zip(*arrays):
+        record = dict(constants)
+        record.update(zip(columns, values))
+        yield record
+
+
+def bulk_insert(db: Session, table: Table, records: Iterator[Dict[str, Any]],
+                batch_size: int = INGEST_BATCH_SIZE,
+                on_batch: Optional[Callable[[int], None]] = None) -> int:
+    """分批寫入，回傳寫入筆數（沿用呼叫端的交易）
+
+    PostgreSQL使用COPY，其餘資料庫使用executemany。
+    on_batch會在每批寫入後以該批筆數呼叫，用於回報進度。
+    """
+    dialect = db.get_bind().dialect
+    if INGEST_METHOD == "auto" and dialect.name == "postgresql" and dialect.driver in ("psycopg2", "psycopg"):
+        write = _copy_writer(db, table)
+    else:
+        statement = table.insert()
+        write = lambda batch: db.execute(statement, batch)
+
+    total = 0
+    batch: List[Dict[str, Any]] = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            total += _write_batch(write, batch, on_batch)
+            batch = []
+    if batch:
+        total += _write_batch(write, batch, on_batch)
+    return total
+
+
+def _write_batch(write: Callable[[List[Dict[str, Any]]], Any], batch: List[Dict[str, Any]],
+                 on_batch: Optional[Callable[[int], None]]) -> int:
+    write(batch)
+    if on_batch is not None:
+        on_batch(len(batch))
+    return len(batch)
+
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _copy_text(value: Any) -> str:
+    """COPY文字格式的欄位值（NULL為\\N，跳脫反斜線與控制字元）"""
+    if value is None:
+        return "\\N"
+    return str(value).translate(_COPY_ESCAPES)
+
+
+def _copy_writer(db: Session, table: Table) -> Callable[[List[Dict[str, Any]]], None]:
+    """以COPY FROM STDIN寫入一批資料的函式（支援psycopg2與psycopg 3）"""
+    connection = db.connection()
+    dbapi_connection = connection.connection.dbapi_connection
+    driver = connection.dialect.driver
+    preparer = connection.dialect.identifier_preparer
+
+    def write(batch: List[Dict[str, Any]]) -> None:
+        columns = list(batch[0])
+        column_list = ", ".join(preparer.quote(column) for column in columns)
+        sql = f"COPY {preparer.format_table(table)} ({column_list}) FROM STDIN"
+        cursor = dbapi_connection.cursor()
+        try:
+            if driver == "psycopg2":
+                buffer = io.StringIO()
+                for record in batch:
+                    buffer.write("\t".join(_copy_text(record[column]) for column in columns))
+                    buffer.write("\n")
+                buffer.seek(0)
+                cursor.copy_expert(sql, buffer)
+            else:
+                with cursor.copy(sql) as copy:
+                    for record in batch:
+                        copy.write_row([record[column] for column in columns])
+        finally:
+            cursor.close()
+
+    return write
+
+
+def report_throughput(filename: str, cells: int, elapsed: float) -> float:
+    """記錄寫入吞吐量（儲存格/秒），低於目標時發出警告
+
+    少於INGEST_TARGET_MIN_CELLS格的檔案以固定成本為主，速度不具代表性，只記錄INFO。
+    """
+    rate = cells / elapsed if elapsed > 0 else float(cells)
+    if cells >= INGEST_TARGET_MIN_CELLS and rate < INGEST_TARGET_CELLS_PER_SEC:
+        logger.warning(
+            f"檔案 {filename} 寫入速度 {rate:.0f} 格/秒，低於目標 {INGEST_TARGET_CELLS_PER_SEC:.0f} 格/秒"
+        )
+    else:
+        logger.info(f"檔案 {filename} 寫入 {cells} 格，耗時 {elapsed:.2f} 秒（{rate:.0f} 格/秒）")
+    return rate
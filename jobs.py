@@ -0,0 +1,180 @@
+"""
+上傳與刪除工作的進度追蹤
+
+持久狀態（queued/processing/completed/error）記錄在FileUpload資料表；
+處理中的即時進度（已完成工作表、已寫入儲存格數、吞吐量）則保存在記憶體中，
+讓其他請求在交易提交前也能查詢。
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+
+class UploadJob:
+    """單一上傳工作的即時進度（由工作執行緒更新）"""
+
+    def __init__(self, job_id: int, filename: str, status: str = "queued"):
+        self.job_id = job_id
+        self.filename = filename
+        self.status = status
+        self.sheets_total = 0
+        self.sheets_done = 0
+        self.cells_written = 0
+        self.sheet_errors: Dict[str, str] = {}
+        self.error: Optional[str] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "error")
+
+    def start(self, sheets_total: int) -> None:
+        with self._lock:
+            self.status = "processing"
+            self.sheets_total = sheets_total
+            self.started_at = datetime.utcnow()
+
+    def add_cells(self, count: int) -> None:
+        with self._lock:
+            self.cells_written += count
+
+    def sheet_done(self, sheet_name: str, error: Optional[str] = None) -> None:
+        with self._lock:
+            self.sheets_done += 1
+            if error:
+                self.sheet_errors[sheet_name] = error
+
+    def complete(self, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self.status = "completed"
+            self.result = result
+            self.finished_at = datetime.utcnow()
+
+    def fail(self, error: str) -> None:
+        with self._lock:
+            self.status = "error"
+            self.error = error
+            self.finished_at = datetime.utcnow()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """取得目前進度（含吞吐量）"""
+        with self._lock:
+            elapsed = None
+            if self.started_at:
+                elapsed = ((self.finished_at or datetime.utcnow()) - self.started_at).total_seconds()
+            return {
+                "job_id": self.job_id,
+                "filename": self.filename,
+                "status": self.status,
+                "sheets_total": self.sheets_total,
+                "sheets_done": self.sheets_done,
+                "cells_written": self.cells_written,
+                "cells_per_second": round(self.cells_written / elapsed, 1) if elapsed else None,
+                "elapsed_seconds": round(elapsed, 3) if elapsed is not None else None,
+                "sheet_errors": dict(self.sheet_errors),
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+
+class DeleteJob:
+    """批次刪除工作的即時進度"""
+
+    def __init__(self, job_id: int, file_ids: List[int], cells_total: int = 0):
+        self.job_id = job_id
+        self.file_ids = list(file_ids)
+        self.cells_total = cells_total
+        self.status = "queued"
+        self.files_done = 0
+        self.rows_removed = 0
+        self.error: Optional[str] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "error")
+
+    def start(self) -> None:
+        with self._lock:
+            self.status = "processing"
+            self.started_at = datetime.utcnow()
+
+    def add_rows(self, count: int) -> None:
+        with self._lock:
+            self.rows_removed += count
+
+    def file_done(self) -> None:
+        with self._lock:
+            self.files_done += 1
+
+    def complete(self, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self.status = "completed"
+            self.result = result
+            self.finished_at = datetime.utcnow()
+
+    def fail(self, error: str) -> None:
+        with self._lock:
+            self.status = "error"
+            self.error = error
+            self.finished_at = datetime.utcnow()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "status": self.status,
+                "file_ids": list(self.file_ids),
+                "files_done": self.files_done,
+                "cells_total": self.cells_total,
+                "rows_removed": self.rows_removed,
+                "error": self.error,
+                "result": self.result,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+
+class JobRegistry:
+    """以工作ID（上傳工作即FileUpload.id）索引的進度表，只保留最近完成的工作"""
+
+    def __init__(self, max_finished: int = 1000):
+        self.max_finished = max_finished
+        self._jobs: "OrderedDict[int, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, job_id: int, filename: str, status: str = "queued") -> UploadJob:
+        return self.add(UploadJob(job_id, filename, status))
+
+    def add(self, job: Any) -> Any:
+        """登記工作（需有job_id與finished屬性）"""
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune()
+        return job
+
+    def get(self, job_id: int) -> Optional[Any]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def discard(self, job_id: int) -> None:
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def _prune(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
@@ -0,0 +1,247 @@
+"""
+效能指標
+
+程序內的計數器、量測值與直方圖，由 /metrics 以Prometheus文字格式輸出。
+上傳流程各階段（讀取內容、雜湊、重複檢查、開啟工作簿、解析、展開、寫入、提交）
+以stage標籤記錄在同一個直方圖中；多worker部署時每個程序各自計數，由Prometheus彙總。
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+T = TypeVar("T")
+
+# 秒數直方圖的預設區間（上傳可能長達數十秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"指標 {self.name} 需要標籤 {self.labels}，收到 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """只增不減的累計值"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        # 沒有標籤的指標一開始就輸出0
+        self._values: Dict[LabelValues, float] = {} if self.labels else {(): 0.0}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """可任意設定的目前值"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        # 沒有標籤的指標一開始就輸出0
+        self._values: Dict[LabelValues, float] = {} if self.labels else {(): 0.0}
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """依區間累計的觀測值分布（含總和與次數）"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # 每組標籤：[各區間次數..., 總和, 次數]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[position] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """記錄with區塊的執行秒數（區塊拋出例外時同樣記錄）"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def time_iter(self, iterable: Iterable[T], **labels: str) -> Iterator[T]:
+        """逐項產生iterable的內容，記錄每次取得下一項所花的秒數"""
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.observe(time.perf_counter() - started, **labels)
+            yield item
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        lines = []
+        for key, state in items:
+            cumulative = 0.0
+            for position, bound in enumerate(self.buckets):
+                cumulative += state[position]
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {_format_value(state[-1])}")
+        return lines
+
+
+class MetricsRegistry:
+    """登記的指標，依登記順序輸出"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Optional[Sequence[float]] = None) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets or DEFAULT_BUCKETS))
+
+    def render(self) -> str:
+        """Prometheus文字格式（text/plain; version=0.0.4）"""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# 上傳流程各階段耗時
+upload_stage_seconds = registry.histogram(
+    "upload_stage_seconds", "上傳流程各階段的耗時（秒）", ["stage"]
+)
+# 寫入吞吐量（展開+寫入，不含解析）
+ingest_cells_total = registry.counter("ingest_cells_total", "上傳寫入的儲存格數")
+ingest_seconds_total = registry.counter("ingest_seconds_total", "展開與寫入儲存格的累計秒數")
+ingest_cells_per_second = registry.gauge("ingest_cells_per_second", "最近一次上傳的寫入速度（格/秒）")
+# 速率限制的判斷結果
+rate_limit_decisions_total = registry.counter(
+    "rate_limit_decisions_total", "速率限制判斷次數（allowed / blocked）", ["result"]
+)
+# 各端點的請求延遲（route為路由樣板，例如 /files/{file_id}/）
+http_request_duration_seconds = registry.histogram(
+    "http_request_duration_seconds", "各端點的請求延遲（秒）", ["method", "route", "status"]
+)
+
+
+class RequestLatencyMiddleware:
+    """請求延遲（純ASGI中介層）：依路由樣板記錄到回應完整送出為止（含串流回應）
+
+    未符合任何路由者記為unmatched，避免標籤數量無限增加；狀態碼取自http.response.start，
+    未送出回應即發生例外時記為500。
+    """
+
+    def __init__(self, app: ASGIApp, histogram: Histogram = http_request_duration_seconds):
+        self.app = app
+        self.histogram = histogram
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # 路由比對後scope中才有route
+            route = scope.get("route")
+            self.histogram.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status_code)
+            )
@@ -0,0 +1,286 @@
+"""
+請求效能剖析
+
+兩種選擇性啟用的診斷工具：
+- 剖析模式：管理者在請求加上 X-Profile 標頭（或 profile 查詢參數）時，以cProfile或
+  取樣剖析器執行該請求；結果保存在記憶體中，回應標頭 X-Profile-Id 為其編號
+- 慢請求SQL紀錄：SLOW_REQUEST_SECONDS大於0時才在引擎上註冊事件，記錄每個請求
+  執行的SQL與耗時，超過門檻的請求寫入日誌並保存
+
+ProfilingMiddleware為純ASGI中介層，不包裝回應（串流回應直接傳遞）；
+只在設定管理金鑰或啟用慢請求紀錄時安裝，兩者皆未使用時請求不經過任何剖析程式碼。
+"""
+
+import cProfile
+import io
+import itertools
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import Headers, QueryParams
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "0"))  # 超過此秒數的請求記錄SQL，0為停用
+SLOW_REQUEST_MAX_STATEMENTS = int(os.getenv("SLOW_REQUEST_MAX_STATEMENTS", "200"))  # 每個請求保留的SQL數
+PROFILE_HISTORY = int(os.getenv("PROFILE_HISTORY", "20"))  # 保留於記憶體的剖析結果與慢請求數
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))  # 取樣剖析的間隔秒數
+
+# cprofile：確定性剖析事件迴圈執行緒；sample：定期取樣所有執行緒的呼叫堆疊（含上傳工作執行緒）
+PROFILE_MODES = ("cprofile", "sample")
+
+
+class QueryLog:
+    """單一請求執行的SQL（超過上限後只累計次數與時間）"""
+
+    def __init__(self, max_statements: int = SLOW_REQUEST_MAX_STATEMENTS):
+        self.max_statements = max_statements
+        self.statements: List[Dict[str, Any]] = []
+        self.count = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, seconds: float, executemany: bool) -> None:
+        with self._lock:
+            self.count += 1
+            self.seconds += seconds
+            if len(self.statements) < self.max_statements:
+                self.statements.append({
+                    "sql": statement,
+                    "ms": round(seconds * 1000, 3),
+                    "executemany": executemany,
+                })
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "count": self.count,
+                "seconds": round(self.seconds, 4),
+                "statements": list(self.statements),
+                "truncated": self.count > len(self.statements),
+            }
+
+
+# 目前請求的SQL紀錄；工作執行緒經由複製的context取得同一份
+_current_log: ContextVar[Optional[QueryLog]] = ContextVar("query_log", default=None)
+
+
+def install_sql_capture(engine: Engine) -> None:
+    """在引擎上註冊計時事件（非同步引擎請傳入其sync_engine）"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        log = _current_log.get()
+        if log is not None:
+            log.record(statement, time.perf_counter() - started, executemany)
+
+
+class StackSampler:
+    """定期取樣所有執行緒的呼叫堆疊，輸出collapsed stack格式（可用於火焰圖）"""
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.total = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+            self.total += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def report(self) -> str:
+        lines = [f"# {self.total} samples, interval {self.interval * 1000:.1f} ms"]
+        lines += [f"{stack} {count}" for stack, count in self.samples.most_common()]
+        return "\n".join(lines) + "\n"
+
+
+class ProfileStore:
+    """最近的剖析結果與慢請求（固定數量，舊的自動捨棄）"""
+
+    def __init__(self, maxlen: int = PROFILE_HISTORY):
+        self._items: deque = deque(maxlen=maxlen)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def reserve(self) -> int:
+        """預先取得編號（結果完成前就需要放入回應標頭時使用）"""
+        with self._lock:
+            return next(self._ids)
+
+    def add(self, record: Dict[str, Any], record_id: Optional[int] = None) -> Dict[str, Any]:
+        with self._lock:
+            record_id = next(self._ids) if record_id is None else record_id
+            record = {"id": record_id, "created_at": datetime.utcnow(), **record}
+            self._items.append(record)
+        return record
+
+    def get(self, record_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return next((item for item in self._items if item["id"] == record_id), None)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(reversed(self._items))
+
+
+class ProfilingBusyError(Exception):
+    """已有其他請求正在剖析（同一程序同時只能有一個剖析器）"""
+
+
+class RequestProfiler:
+    """中介層使用：依需要剖析請求、記錄SQL並保存結果"""
+
+    def __init__(self, slow_seconds: float = SLOW_REQUEST_SECONDS):
+        self.slow_seconds = slow_seconds
+        self.capture_sql = slow_seconds > 0
+        self.profiles = ProfileStore()
+        self.slow_requests = ProfileStore()
+        self._profiling = threading.Lock()
+
+    def install(self, *engines: Engine) -> None:
+        """慢請求紀錄啟用時才在引擎上註冊事件"""
+        if self.capture_sql:
+            for engine in engines:
+                install_sql_capture(engine)
+
+    async def run(self, app: ASGIApp, scope: Scope, receive: Receive, send: Send, mode: Optional[str]) -> None:
+        """執行請求；mode為None時只記錄SQL（慢請求紀錄啟用時）
+
+        記錄到回應完整送出為止（含串流回應）。剖析結果的編號預先取得，
+        在回應開始時即放入X-Profile-Id標頭。
+        """
+        if mode is not None and not self._profiling.acquire(blocking=False):
+            raise ProfilingBusyError("已有其他請求正在剖析，請稍後再試")
+        profile_id = self.profiles.reserve() if mode is not None else None
+        status_code = 500
+
+        async def send_with_profile_id(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if profile_id is not None:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-profile-id", str(profile_id).encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        log = QueryLog() if self.capture_sql else None
+        token = _current_log.set(log)
+        profiler = None
+        if mode == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+        elif mode == "sample":
+            profiler = StackSampler()
+            profiler.start()
+        started = time.perf_counter()
+        try:
+            await app(scope, receive, send_with_profile_id)
+        finally:
+            elapsed = time.perf_counter() - started
+            if mode == "cprofile":
+                profiler.disable()
+            elif mode == "sample":
+                profiler.stop()
+            if mode is not None:
+                self._profiling.release()
+            _current_log.reset(token)
+
+            summary = {
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope["query_string"].decode("latin-1"),
+                "status": status_code,
+                "seconds": round(elapsed, 4),
+                "sql": log.summary() if log is not None else None,
+            }
+            if mode is not None:
+                self.profiles.add({**summary, "mode": mode, "profile": _report(profiler)}, record_id=profile_id)
+            if log is not None and elapsed >= self.slow_seconds:
+                logger.warning(
+                    f"慢請求 {scope['method']} {scope['path']} 耗時 {elapsed:.2f} 秒，"
+                    f"執行SQL {log.count} 次共 {log.seconds:.2f} 秒"
+                )
+                self.slow_requests.add(summary)
+
+
+class ProfilingMiddleware:
+    """剖析模式：X-Profile標頭或profile查詢參數指定cprofile或sample，需附上X-Admin-Key管理金鑰
+
+    未指定剖析模式且未啟用慢請求紀錄時直接交給下一層。
+    """
+
+    def __init__(self, app: ASGIApp, profiler: RequestProfiler, is_admin_key: Callable[[Optional[str]], bool]):
+        self.app = app
+        self.profiler = profiler
+        self.is_admin_key = is_admin_key
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        mode = headers.get("x-profile") or QueryParams(scope["query_string"]).get("profile")
+        if mode is None and not self.profiler.capture_sql:
+            await self.app(scope, receive, send)
+            return
+        error = None
+        if mode is not None:
+            if not self.is_admin_key(headers.get("x-admin-key")):
+                error = JSONResponse(status_code=403, content={"detail": "剖析模式需要有效的管理金鑰"})
+            elif mode not in PROFILE_MODES:
+                error = JSONResponse(status_code=400, content={"detail": f"不支援的剖析模式，可用: {', '.join(PROFILE_MODES)}"})
+        if error is None:
+            try:
+                await self.profiler.run(self.app, scope, receive, send, mode)
+                return
+            except ProfilingBusyError as e:
+                error = JSONResponse(status_code=409, content={"detail": str(e)})
+        await error(scope, receive, send)
+
+
+def _report(profiler) -> str:
+    if isinstance(profiler, StackSampler):
+        return profiler.report()
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(60)
+    return output.getvalue()
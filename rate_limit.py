@@ -0,0 +1,152 @@
+"""
+速率限制
+
+預設使用程序內的令牌桶（每個IP一個桶），檢查只需微秒等級且不寫入資料庫；
+多worker部署可改用Redis共用計數。UserSession資料表僅作為稽核紀錄，
+由SessionAuditBuffer定期批次寫入。
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitDecision:
+    """單次速率限制檢查的結果"""
+
+    def __init__(self, key: str, allowed: bool, remaining: int, retry_after: float = 0.0):
+        self.key = key
+        self.allowed = allowed
+        self.remaining = remaining
+        self.retry_after = retry_after
+
+
+class TokenBucketLimiter:
+    """程序內令牌桶：容量為limit，每window秒補滿"""
+
+    blocking = False
+
+    def __init__(self, limit: int, window: float, evict_interval: float = 60.0):
+        self.limit = limit
+        self.window = window
+        self.rate = limit / window
+        self.evict_interval = evict_interval
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._last_evict = time.monotonic()
+
+    def hit(self, key: str) -> RateLimitDecision:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (float(self.limit), now))
+            tokens = min(float(self.limit), tokens + (now - updated) * self.rate)
+            if tokens >= 1.0:
+                tokens -= 1.0
+                decision = RateLimitDecision(key, True, int(tokens))
+            else:
+                decision = RateLimitDecision(key, False, 0, (1.0 - tokens) / self.rate)
+            self._buckets[key] = (tokens, now)
+            if now - self._last_evict >= self.evict_interval:
+                self._evict_idle(now)
+        return decision
+
+    def _evict_idle(self, now: float) -> None:
+        # 閒置超過一個週期的桶必定已補滿，移除後與新建的桶等價
+        idle = [key for key, (_, updated) in self._buckets.items() if now - updated >= self.window]
+        for key in idle:
+            del self._buckets[key]
+        self._last_evict = now
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class RedisRateLimiter:
+    """以Redis固定時間窗計數，讓多個worker共用限制"""
+
+    blocking = True
+
+    def __init__(self, limit: int, window: float, url: str, prefix: str = "ratelimit"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis 需要安裝 redis 套件")
+        self.limit = limit
+        self.window = int(window)
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def hit(self, key: str) -> RateLimitDecision:
+        now = time.time()
+        window_key = f"{self.prefix}:{key}:{int(now // self.window)}"
+        pipe = self._client.pipeline()
+        pipe.incr(window_key)
+        pipe.expire(window_key, self.window)
+        count, _ = pipe.execute()
+        if count <= self.limit:
+            return RateLimitDecision(key, True, self.limit - count)
+        return RateLimitDecision(key, False, 0, self.window - now % self.window)
+
+
+def create_rate_limiter(backend: str, limit: int, window: float, redis_url: Optional[str] = None):
+    """依設定建立速率限制後端（memory 或 redis）"""
+    if backend == "memory":
+        return TokenBucketLimiter(limit, window)
+    if backend == "redis":
+        if not redis_url:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis 需要設定 RATE_LIMIT_REDIS_URL")
+        return RedisRateLimiter(limit, window, redis_url)
+    raise RuntimeError(f"不支援的速率限制後端: {backend}")
+
+
+class SessionAuditBuffer:
+    """累積每個IP的請求次數，由背景執行緒定期交給flush函式批次寫入"""
+
+    def __init__(self):
+        self._activity: Dict[str, Tuple[int, datetime]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._flush: Optional[Callable[[Dict[str, Tuple[int, datetime]]], None]] = None
+
+    def record(self, key: str) -> None:
+        now = datetime.utcnow()
+        with self._lock:
+            count, _ = self._activity.get(key, (0, now))
+            self._activity[key] = (count + 1, now)
+
+    def drain(self) -> Dict[str, Tuple[int, datetime]]:
+        """取出並清空目前累積的紀錄：{IP: (請求次數, 最後活動時間)}"""
+        with self._lock:
+            activity, self._activity = self._activity, {}
+        return activity
+
+    def start(self, flush: Callable[[Dict[str, Tuple[int, datetime]]], None], interval: float) -> None:
+        self._flush = flush
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="session-audit", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """停止背景執行緒並寫入剩餘紀錄"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush_now()
+
+    def flush_now(self) -> None:
+        activity = self.drain()
+        if activity and self._flush is not None:
+            try:
+                self._flush(activity)
+            except Exception as e:
+                logger.error(f"寫入會話稽核紀錄時發生錯誤: {str(e)}")
+
+    def _run(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            self.flush_now()
@@ -0,0 +1,274 @@
+"""
+Excel讀取後端
+
+依EXCEL_READER選擇解析工作簿的方式：
+- openpyxl：以read_only模式逐列讀取儲存格的值（values_only），不建立儲存格物件
+- calamine：pandas的calamine引擎（需安裝python-calamine），.xlsx與.xls皆可讀取
+- pandas：pandas預設的read_excel
+- auto：有安裝python-calamine時使用calamine，否則使用openpyxl
+
+.xls（OLE2格式）除非指定calamine，一律交由xlrd讀取。各後端產生的DataFrame
+與pd.read_excel一致（第一列為欄名、空白欄名為Unnamed: n、重複欄名加上.1）。
+
+EXCEL_PARSE_PROCESSES大於0時，多工作表的檔案由程序池平行解析各工作表。
+指定chunk_rows時改為串流讀取：每次產生固定列數的DataFrame（索引延續整張工作表
+的列號），記憶體用量與工作表大小無關。文字儲存格不會依同段其他列轉為數值，
+展開後的儲存格與整張讀取相同。串流讀取不使用程序池：程序池必須把整張工作表的
+DataFrame傳回主程序，會失去記憶體上限，因此只在chunk_rows為0時平行解析。
+"""
+
+import io
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
+
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+EXCEL_READER = os.getenv("EXCEL_READER", "auto")  # auto、openpyxl、calamine 或 pandas
+EXCEL_PARSE_PROCESSES = int(os.getenv("EXCEL_PARSE_PROCESSES", "0"))  # 平行解析工作表的程序數，0為不使用程序池
+
+READERS = ("auto", "openpyxl", "calamine", "pandas")
+
+# 檔案開頭的特徵位元組
+_ZIP_MAGIC = b"PK\x03\x04"
+_OLE2_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+
+# openpyxl的values_only模式將錯誤儲存格讀成錯誤代碼字串，pandas則視為缺值
+_ERROR_CODES = frozenset(("#NULL!", "#DIV/0!", "#VALUE!", "#REF!", "#NAME?", "#NUM!", "#N/A", "#GETTING_DATA"))
+
+Source = Union[str, bytes]
+
+
+def calamine_available() -> bool:
+    try:
+        import python_calamine  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def detect_format(source: Source) -> Optional[str]:
+    """由檔案開頭判斷格式：xlsx（zip）、xls（OLE2），無法判斷時回傳None"""
+    if isinstance(source, bytes):
+        head = source[:8]
+    else:
+        with open(source, "rb") as f:
+            head = f.read(8)
+    if head.startswith(_ZIP_MAGIC):
+        return "xlsx"
+    if head == _OLE2_MAGIC:
+        return "xls"
+    return None
+
+
+def resolve_reader(source: Source, reader: str = EXCEL_READER) -> str:
+    """決定實際使用的後端：openpyxl、calamine、xlrd 或 pandas"""
+    if reader not in READERS:
+        raise ValueError(f"不支援的EXCEL_READER: {reader}")
+    if reader == "auto":
+        reader = "calamine" if calamine_available() else "openpyxl"
+    if reader == "calamine":
+        return "calamine"
+    file_format = detect_format(source)
+    if file_format == "xls":
+        return "xlrd"
+    if reader == "openpyxl" and file_format != "xlsx":
+        # 非xlsx（例如xlsb）交由pandas依內容判斷引擎
+        return "pandas"
+    return reader
+
+
+def _convert_value(value):
+    """比照pandas openpyxl讀取器的轉換：空白為""、錯誤為缺值、整數值的浮點數轉為int"""
+    if value is None:
+        return ""
+    if type(value) is float:
+        return int(value) if value.is_integer() else value
+    if type(value) is str and value in _ERROR_CODES:
+        return float("nan")
+    return value
+
+
+def _rows_to_frame(rows: List[list], start: int = 0) -> pd.DataFrame:
+    """將儲存格值（第一列為欄名）交給pandas的文字解析器，欄名與缺值處理與read_excel相同
+
+    以object讀入，文字儲存格（例如"007"）不會依同段其他列被轉為數值，
+    欄位型別再由儲存格本身的值推斷。start為第一筆資料在工作表中的位置（串流讀取時的索引起點）。
+    """
+    if not any(rows):
+        return pd.DataFrame()
+    width = max(len(row) for row in rows)
+    data = [row + [""] * (width - len(row)) for row in rows]
+    df = TextParser(data, header=0, skip_blank_lines=False, dtype=object).read().infer_objects()
+    if start:
+        df.index = pd.RangeIndex(start, start + len(df))
+    return df
+
+
+class OpenpyxlWorkbook:
+    """以openpyxl read_only/values_only模式讀取xlsx"""
+
+    def __init__(self, source: Source):
+        from openpyxl import load_workbook
+
+        self.book = load_workbook(io.BytesIO(source) if isinstance(source, bytes) else source,
+                                  read_only=True, data_only=True, keep_links=False)
+        self.sheet_names = self.book.sheetnames
+
+    def iter_rows(self, sheet_name: str) -> Iterator[list]:
+        """逐列產生轉換後的儲存格值（已去除列尾空白）"""
+        sheet = self.book[sheet_name]
+        # 部分程式產生的檔案記錄了錯誤的工作表範圍，以實際內容為準
+        sheet.reset_dimensions()
+        for values in sheet.iter_rows(values_only=True):
+            row = [_convert_value(value) for value in values]
+            while row and row[-1] == "":
+                row.pop()
+            yield row
+
+    def parse(self, sheet_name: str) -> pd.DataFrame:
+        rows = []
+        last_row_with_data = -1
+        for row_number, row in enumerate(self.iter_rows(sheet_name)):
+            if row:
+                last_row_with_data = row_number
+            rows.append(row)
+        return _rows_to_frame(rows[:last_row_with_data + 1])
+
+    def iter_frames(self, sheet_name: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+        """每次讀取chunk_rows列，與第一列的欄名一起解析為DataFrame"""
+        rows = self.iter_rows(sheet_name)
+        header = next(rows, [])
+        start = 0
+        chunk: List[list] = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                yield _rows_to_frame([header] + chunk, start)
+                start += len(chunk)
+                chunk = []
+        # 與整張讀取相同，去除工作表結尾的空白列
+        while chunk and not chunk[-1]:
+            chunk.pop()
+        if chunk or not start:
+            yield _rows_to_frame([header] + chunk, start)
+
+    def close(self) -> None:
+        self.book.close()
+
+
+class PandasWorkbook:
+    """以pd.ExcelFile讀取（pandas預設引擎、calamine或xlrd）"""
+
+    def __init__(self, source: Source, engine: Optional[str] = None):
+        self.excel_file = pd.ExcelFile(io.BytesIO(source) if isinstance(source, bytes) else source, engine=engine)
+        self.sheet_names = self.excel_file.sheet_names
+
+    def parse(self, sheet_name: str) -> pd.DataFrame:
+        # 與OpenpyxlWorkbook相同：文字儲存格維持文字
+        return self.excel_file.parse(sheet_name=sheet_name, dtype=object).infer_objects()
+
+    def iter_frames(self, sheet_name: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+        """pandas的引擎無法逐列讀取：整張解析後再分段，只讓後續的寫入分批進行"""
+        df = self.parse(sheet_name)
+        for start in range(0, max(len(df), 1), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+
+    def close(self) -> None:
+        self.excel_file.close()
+
+
+def _load(source: Source, reader: str):
+    if reader == "openpyxl":
+        return OpenpyxlWorkbook(source)
+    return PandasWorkbook(source, engine=None if reader == "pandas" else reader)
+
+
+def _parse_sheet(source: Source, reader: str, sheet_name: str) -> pd.DataFrame:
+    """程序池中執行：開啟工作簿並解析單一工作表"""
+    book = _load(source, reader)
+    try:
+        return book.parse(sheet_name)
+    finally:
+        book.close()
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def parse_pool() -> Optional[ProcessPoolExecutor]:
+    """EXCEL_PARSE_PROCESSES大於0時建立（僅一次）解析用的程序池"""
+    global _pool
+    if EXCEL_PARSE_PROCESSES <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=EXCEL_PARSE_PROCESSES)
+        return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+class Workbook:
+    """開啟的工作簿；sheets()依序產生（工作表名稱, 取得DataFrame序列的函式）"""
+
+    def __init__(self, source: Source, reader: str = EXCEL_READER, pool: Optional[ProcessPoolExecutor] = None):
+        self.source = source
+        self.reader = resolve_reader(source, reader)
+        self.pool = pool
+        self.book = _load(source, self.reader)
+        self.sheet_names = list(self.book.sheet_names)
+
+    def parse(self, sheet_name: str) -> pd.DataFrame:
+        return self.book.parse(sheet_name)
+
+    def iter_frames(self, sheet_name: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+        return self.book.iter_frames(sheet_name, chunk_rows)
+
+    def sheets(self, chunk_rows: int = 0) -> Iterator[Tuple[str, Callable[[], Iterable[pd.DataFrame]]]]:
+        """依序產生各工作表的讀取函式
+
+        chunk_rows為0時讀取函式回傳整張工作表（單一DataFrame的清單）；有程序池且工作表
+        多於一個時先全部送出平行解析。chunk_rows大於0時回傳串流讀取的DataFrame序列，
+        不使用程序池（見模組說明）。
+        """
+        if chunk_rows > 0:
+            for sheet_name in self.sheet_names:
+                yield sheet_name, partial(self.iter_frames, sheet_name, chunk_rows)
+            return
+        if self.pool is None or len(self.sheet_names) < 2:
+            for sheet_name in self.sheet_names:
+                yield sheet_name, lambda sheet_name=sheet_name: [self.parse(sheet_name)]
+            return
+        futures = [self.pool.submit(_parse_sheet, self.source, self.reader, sheet_name)
+                   for sheet_name in self.sheet_names]
+        try:
+            for sheet_name, future in zip(self.sheet_names, futures):
+                yield sheet_name, lambda future=future: [future.result()]
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def close(self) -> None:
+        self.book.close()
+
+    def __enter__(self) -> "Workbook":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def open_workbook(source: Source, reader: str = EXCEL_READER) -> Workbook:
+    """開啟工作簿（source為檔案路徑或位元組內容）"""
+    return Workbook(source, reader, parse_pool())
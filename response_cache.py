@@ -0,0 +1,217 @@
+"""
+讀取端點的回應快取
+
+快取內容為已序列化的JSON回應與其ETag，鍵為端點名稱加上正規化後的查詢參數。
+資料異動（上傳、刪除）時呼叫invalidate()遞增版本（generation），每筆內容都帶著
+寫入時的版本，讀取時版本不符即視為未命中，正在計算中的舊版本結果也不會寫入快取。
+
+版本號保存在儲存後端內：程序內後端（MemoryCacheBackend）只供單一worker使用；
+多worker部署改用RedisCacheBackend，版本號為Redis中的計數器，任一worker的異動
+會讓所有worker的快取同時失效。
+"""
+
+import hashlib
+import json
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
+
+from cache import LRUCache
+
+
+def cache_key(name: str, **params: Any) -> Tuple[Hashable, ...]:
+    """端點名稱加上排序後的參數（忽略None，清單轉為tuple）"""
+    items = []
+    for key, value in sorted(params.items()):
+        if value is None:
+            continue
+        if isinstance(value, list):
+            value = tuple(value)
+        items.append((key, value))
+    return (name,) + tuple(items)
+
+
+class CachedResponse:
+    """已序列化的JSON回應"""
+
+    def __init__(self, body: bytes, headers: Optional[Dict[str, str]] = None):
+        self.body = body
+        self.headers = headers or {}
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any(tag.removeprefix("W/") == self.etag for tag in tags)
+
+    def to_response(self, request: Request) -> Response:
+        """依If-None-Match回傳304或完整內容；瀏覽器每次都需重新驗證"""
+        headers = {**self.headers, "ETag": self.etag, "Cache-Control": "private, no-cache"}
+        if self.matches(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+        return Response(content=self.body, media_type="application/json", headers=headers)
+
+
+class MemoryCacheBackend:
+    """程序內後端：LRUCache加上本地版本號，遞增版本時一併清除內容"""
+
+    blocking = False
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def generation(self) -> int:
+        return self._generation
+
+    def bump(self) -> int:
+        with self._lock:
+            self._generation += 1
+            self._cache.clear()
+            return self._generation
+
+    def get(self, key: Hashable, generation: int) -> Optional[CachedResponse]:
+        item = self._cache.get(key)
+        if item is not None and item[0] == generation:
+            return item[1]
+        return None
+
+    def set(self, key: Hashable, generation: int, cached: CachedResponse) -> None:
+        with self._lock:
+            # 計算期間資料已異動時不寫入，避免存入舊版本的結果
+            if generation == self._generation:
+                self._cache.set(key, (generation, cached))
+
+    def size(self) -> Optional[int]:
+        return len(self._cache)
+
+
+class RedisCacheBackend:
+    """以Redis共用快取與版本號，讓多個worker看到相同的失效
+
+    內容的鍵包含版本號，版本遞增後舊內容不會再被讀取，由TTL自然過期。
+    """
+
+    blocking = True
+
+    def __init__(self, url: str, ttl: float, prefix: str = "response_cache"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RESPONSE_CACHE_BACKEND=redis 需要安裝 redis 套件")
+        self.ttl = max(int(ttl), 1)
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def generation(self) -> int:
+        return int(self._client.get(f"{self.prefix}:generation") or 0)
+
+    def bump(self) -> int:
+        return int(self._client.incr(f"{self.prefix}:generation"))
+
+    def _entry_key(self, key: Hashable, generation: int) -> str:
+        digest = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+        return f"{self.prefix}:{generation}:{digest}"
+
+    def get(self, key: Hashable, generation: int) -> Optional[CachedResponse]:
+        raw = self._client.get(self._entry_key(key, generation))
+        if raw is None:
+            return None
+        header, _, body = raw.partition(b"\n")
+        return CachedResponse(body, json.loads(header))
+
+    def set(self, key: Hashable, generation: int, cached: CachedResponse) -> None:
+        raw = json.dumps(cached.headers).encode("utf-8") + b"\n" + cached.body
+        self._client.set(self._entry_key(key, generation), raw, ex=self.ttl)
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+def create_response_cache_backend(backend: str, maxsize: int, ttl: float, redis_url: Optional[str] = None):
+    """依設定建立回應快取後端（memory 或 redis）"""
+    if backend == "memory":
+        return MemoryCacheBackend(maxsize, ttl)
+    if backend == "redis":
+        if not redis_url:
+            raise RuntimeError("RESPONSE_CACHE_BACKEND=redis 需要設定 RESPONSE_CACHE_REDIS_URL")
+        return RedisCacheBackend(redis_url, ttl)
+    raise RuntimeError(f"不支援的回應快取後端: {backend}")
+
+
+class ResponseCache:
+    """帶版本與命中統計的回應快取（版本號由儲存後端保存）"""
+
+    def __init__(self, backend, max_bytes: int = 1048576):
+        self.backend = backend
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key: Hashable,
+                     build: Callable[[], Tuple[Any, Dict[str, str]]]) -> CachedResponse:
+        """取得快取的回應，未命中時呼叫build()產生（內容, 回應標頭）並存入"""
+        generation, cached = self._lookup(key)
+        if cached is None:
+            cached = self._store(key, generation, *build())
+        return cached
+
+    async def aget_or_build(self, key: Hashable,
+                            build: Callable[[], Awaitable[Tuple[Any, Dict[str, str]]]]) -> CachedResponse:
+        """get_or_build的非同步版本，build為協程函式（Redis後端的存取在執行緒中進行）"""
+        if self.backend.blocking:
+            generation, cached = await run_in_threadpool(self._lookup, key)
+            if cached is None:
+                cached = await run_in_threadpool(self._store, key, generation, *await build())
+            return cached
+        generation, cached = self._lookup(key)
+        if cached is None:
+            cached = self._store(key, generation, *await build())
+        return cached
+
+    def _lookup(self, key: Hashable) -> Tuple[int, Optional[CachedResponse]]:
+        generation = self.backend.generation()
+        cached = self.backend.get(key, generation)
+        with self._lock:
+            if cached is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return generation, cached
+
+    def _store(self, key: Hashable, generation: int, content: Any, headers: Dict[str, str]) -> CachedResponse:
+        body = json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                          indent=None, separators=(",", ":")).encode("utf-8")
+        cached = CachedResponse(body, headers)
+        if len(body) <= self.max_bytes:
+            self.backend.set(key, generation, cached)
+        return cached
+
+    def invalidate(self) -> None:
+        """資料異動後呼叫：遞增後端的版本號，所有worker既有的快取內容隨即失效"""
+        self.backend.bump()
+
+    async def ainvalidate(self) -> None:
+        """invalidate的非同步版本（Redis後端在執行緒中進行）"""
+        if self.backend.blocking:
+            await run_in_threadpool(self.backend.bump)
+        else:
+            self.backend.bump()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            hits, misses = self.hits, self.misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 4) if total else None,
+            "size": self.backend.size(),
+            "version": self.backend.generation(),
+        }
@@ -1,32 +1,74 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, status, Request
+from fastapi import FastAPI, HTTPException, Depends, status, Request, Response, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Float
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, Text, Float, ForeignKey, Index, and_, exists, func, inspect, select, text, update
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import Callable, Iterable, Iterator, List, Optional, Dict, Any, Tuple, Union
 import pandas as pd
-import io
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import json
+import base64
+import binascii
 import logging
 import hashlib
 import secrets
 import re
+import time
+import itertools
+import zipfile
 from pathlib import Path
+from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
+
+from cache import LRUCache
+from columnar import create_wide_table, describe_columns, drop_wide_table, iter_wide_records, pivot_cells, read_wide_frame, wide_table_name
+from database import create_async_database_engine, create_database_engine
+from dimensions import DimensionCache
+from export import ARROW_FORMATS, EXPORT_FORMATS, encode_frame, frame_rows, require_pyarrow, stream_export
+from ingest import (INGEST_BATCH_SIZE, NUMERIC_TYPES, TIME_TYPES, bulk_insert, encode_cells, frame_to_cells,
+                    iter_cell_records, parse_typed_value, report_throughput, row_fingerprints)
+from jobs import DeleteJob, JobRegistry, UploadJob
+from metrics import (RequestLatencyMiddleware, ingest_cells_per_second, ingest_cells_total, ingest_seconds_total,
+                     rate_limit_decisions_total, registry, upload_stage_seconds)
+from profiling import ProfilingMiddleware, RequestProfiler
+from rate_limit import RateLimitDecision, SessionAuditBuffer, create_rate_limiter
+import readers
+from response_cache import CachedResponse, ResponseCache, cache_key, create_response_cache_backend
+from uploads import (BatchEntry, ContentLengthLimitMiddleware, InvalidUploadError, StoredUpload, TooManyFilesError,
+                     UploadTooLargeError, extract_archive, receive_uploads)
+from worker_pool import BoundedWorkerPool, PoolSaturatedError
 
 # 設定日誌
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 應用程式生命週期
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    session_audit.start(flush_session_audit, RATE_LIMIT_AUDIT_INTERVAL)
+    if readers.EXCEL_PARSE_PROCESSES > 0 and STORAGE_MODE == "eav" and INGEST_CHUNK_ROWS > 0:
+        logger.warning("EXCEL_PARSE_PROCESSES只在整張讀取工作表時使用（INGEST_CHUNK_ROWS=0或wide/both模式），"
+                       "目前的串流讀取不會使用程序池")
+    yield
+    session_audit.stop()
+    # 等待進行中的上傳與刪除處理完成
+    upload_pool.shutdown()
+    delete_pool.shutdown()
+    readers.shutdown_pool()
+    await async_engine.dispose()
+
 # 建立FastAPI應用程式
 app = FastAPI(
     title="微藻養殖Excel資料收集API (安全版)",
     description="用於收集和管理Excel檔案資料的安全API系統",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # 安全設定
@@ -34,6 +76,76 @@ ALLOWED_HOSTS = os.getenv("ALLOWED_HOSTS", "localhost,127.0.0.1").split(",")
 MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", "10485760"))  # 10MB
 RATE_LIMIT_REQUESTS = int(os.getenv("RATE_LIMIT_REQUESTS", "100"))  # 每小時請求數
 RATE_LIMIT_WINDOW = int(os.getenv("RATE_LIMIT_WINDOW", "3600"))  # 1小時
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory（單一程序）或 redis（多worker共用）
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+RATE_LIMIT_AUDIT_INTERVAL = int(os.getenv("RATE_LIMIT_AUDIT_INTERVAL", "30"))  # 會話稽核紀錄批次寫入間隔（秒）
+
+# 速率限制（檢查不經過資料庫，UserSession只做批次稽核）
+rate_limiter = create_rate_limiter(RATE_LIMIT_BACKEND, RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW, RATE_LIMIT_REDIS_URL)
+session_audit = SessionAuditBuffer()
+
+# 儲存模式：eav（每格一筆）、wide（每個工作表一張寬表）、both（兩者皆寫入）
+# wide模式不寫入excel_cells：/data/ 與 /data/export/ 查無資料，工作表請以 /data/sheet/ 或 /files/{id}/sheets/ 讀取
+STORAGE_MODE = os.getenv("STORAGE_MODE", "eav")
+if STORAGE_MODE not in ("eav", "wide", "both"):
+    raise RuntimeError(f"不支援的儲存模式: {STORAGE_MODE}")
+
+# 工作表讀取設定（寬表需要整張工作表的欄位型別，wide與both模式一律整張讀取）
+INGEST_CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", "10000"))  # eav模式串流讀取時每段的列數，0為整張工作表一次讀取
+MAX_SHEET_ROWS = int(os.getenv("MAX_SHEET_ROWS", "0"))  # 每個工作表的資料列數上限，0為不限制
+MAX_SHEET_ROWS_POLICY = os.getenv("MAX_SHEET_ROWS_POLICY", "truncate")  # truncate（只寫入前段並於結果標示）或 reject（整張工作表不寫入）
+if MAX_SHEET_ROWS_POLICY not in ("truncate", "reject"):
+    raise RuntimeError(f"不支援的列數上限處理方式: {MAX_SHEET_ROWS_POLICY}")
+
+# 上傳處理設定
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))  # 同時處理的上傳數
+UPLOAD_QUEUE_SIZE = int(os.getenv("UPLOAD_QUEUE_SIZE", "8"))  # 排隊等待的上傳數
+UPLOAD_RETRY_AFTER = int(os.getenv("UPLOAD_RETRY_AFTER", "30"))  # 佇列已滿時建議的重試秒數
+UPLOAD_JOB_HISTORY = int(os.getenv("UPLOAD_JOB_HISTORY", "1000"))  # 保留於記憶體的已完成工作數
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", "1048576"))  # 每次讀取的上傳區塊大小
+UPLOAD_TMP_DIR = os.getenv("UPLOAD_TMP_DIR") or None  # 上傳暫存檔目錄（預設為系統暫存目錄）
+UPLOAD_MULTIPART_OVERHEAD = 65536  # multipart表頭與分隔線的容許大小
+HASH_CACHE_SIZE = int(os.getenv("HASH_CACHE_SIZE", "4096"))  # 最近上傳雜湊值快取筆數
+HASH_CACHE_TTL = int(os.getenv("HASH_CACHE_TTL", "300"))  # 雜湊值快取存活秒數（多worker時刪除檔案的生效延遲）
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))  # 匯出時每批讀取的資料列數
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")  # memory（單一程序）或 redis（多worker共用快取與失效）
+RESPONSE_CACHE_REDIS_URL = os.getenv("RESPONSE_CACHE_REDIS_URL")
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))  # 讀取端點回應快取筆數（0為停用，僅memory後端）
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "30"))  # 回應快取存活秒數（memory後端在多worker時為其他worker異動的生效延遲）
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", "1048576"))  # 單筆回應超過此大小時不快取
+DELETE_CHUNK_SIZE = int(os.getenv("DELETE_CHUNK_SIZE", "5000"))  # 每次交易刪除的儲存格數（縮短寫入鎖定時間）
+DELETE_SYNC_MAX_CELLS = int(os.getenv("DELETE_SYNC_MAX_CELLS", "50000"))  # 批次刪除超過此儲存格數時改為背景處理
+DELETE_QUEUE_SIZE = int(os.getenv("DELETE_QUEUE_SIZE", "16"))  # 排隊等待的刪除工作數
+MAX_DELETE_FILES = 500  # 單次批次刪除的檔案數上限
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "500"))  # 單次批次上傳的檔案數上限（含壓縮檔內的檔案）
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "268435456"))  # 單次批次上傳的總大小上限（壓縮檔以解壓縮後計算）
+BATCH_COMMIT_FILES = int(os.getenv("BATCH_COMMIT_FILES", "50"))  # 批次上傳每次提交的檔案數
+BATCH_COMMIT_CELLS = int(os.getenv("BATCH_COMMIT_CELLS", "500000"))  # 未滿檔案數但累計寫入超過此儲存格數時提前提交
+IN_CLAUSE_CHUNK = 500  # 每次以IN查詢的值數（SQLite的參數數量有限）
+
+EXCEL_EXTENSIONS = ['.xlsx', '.xls']
+BATCH_EXTENSIONS = EXCEL_EXTENSIONS + ['.zip']
+
+# Excel解析與寫入在工作執行緒中進行，避免阻塞事件迴圈
+upload_pool = BoundedWorkerPool(UPLOAD_WORKERS, UPLOAD_QUEUE_SIZE, name="upload")
+upload_jobs = JobRegistry(max_finished=UPLOAD_JOB_HISTORY)
+
+# 刪除在單一執行緒中依序進行，分段提交，不長時間佔用寫入鎖
+delete_pool = BoundedWorkerPool(1, DELETE_QUEUE_SIZE, name="delete")
+delete_jobs = JobRegistry(max_finished=UPLOAD_JOB_HISTORY)
+delete_job_ids = itertools.count(1)
+
+# 最近看過的檔案雜湊值 -> FileUpload.id，重複上傳時可省去資料庫查詢
+recent_file_hashes = LRUCache(maxsize=HASH_CACHE_SIZE, ttl=HASH_CACHE_TTL)
+
+# 管理者剖析模式與慢請求SQL紀錄（SLOW_REQUEST_SECONDS為0時不註冊資料庫事件）
+request_profiler = RequestProfiler()
+
+# /files/、/data/、/data/stats/ 的回應快取，資料異動時整批清除
+response_cache = ResponseCache(
+    create_response_cache_backend(RESPONSE_CACHE_BACKEND, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_REDIS_URL),
+    RESPONSE_CACHE_MAX_BYTES
+)
 
 # 添加安全中介軟體
 app.add_middleware(
@@ -48,31 +160,116 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "DELETE"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Link"],
 )
 
+def is_admin_key(key: Optional[str]) -> bool:
+    admin_key = os.getenv("ADMIN_API_KEY")
+    return bool(admin_key and key and secrets.compare_digest(key, admin_key))
+
+# 剖析模式與慢請求紀錄（純ASGI中介層）：需要管理金鑰或啟用慢請求紀錄時才安裝，
+# 否則一般請求完全不經過
+if os.getenv("ADMIN_API_KEY") or request_profiler.capture_sql:
+    app.add_middleware(ProfilingMiddleware, profiler=request_profiler, is_admin_key=is_admin_key)
+
+def file_too_large_error() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"檔案大小超過限制 ({MAX_FILE_SIZE / 1024 / 1024:.1f}MB)"
+    )
+
+def batch_too_large_error() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"批次上傳總大小超過限制 ({MAX_BATCH_SIZE / 1024 / 1024:.1f}MB)"
+    )
+
+# 上傳大小預檢：Content-Length已超過上限時不讀取內容，直接拒絕
+# （沒有Content-Length的分段傳輸由receive_uploads在串流接收時檢查）
+app.add_middleware(
+    ContentLengthLimitMiddleware,
+    limits={
+        "/upload/": (MAX_FILE_SIZE + UPLOAD_MULTIPART_OVERHEAD, file_too_large_error().detail),
+        # 每個檔案各有表頭
+        "/upload/batch/": (MAX_BATCH_SIZE + UPLOAD_MULTIPART_OVERHEAD + MAX_BATCH_FILES * 1024,
+                           batch_too_large_error().detail),
+    }
+)
+
+# 請求延遲：依路由樣板記錄，涵蓋到回應完整送出為止（含串流匯出）
+app.add_middleware(RequestLatencyMiddleware)
+
 # 資料庫設定
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./microalgae_data.db")
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+engine = create_database_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# 非同步引擎：讀取端點在事件迴圈中等待查詢，慢查詢不會阻塞同一worker上的其他請求
+async_engine = create_async_database_engine(SQLALCHEMY_DATABASE_URL, os.getenv("ASYNC_DATABASE_URL"))
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+request_profiler.install(engine, async_engine.sync_engine)
 Base = declarative_base()
 
 # 資料庫模型
 class ExcelData(Base):
-    __tablename__ = "excel_data"
+    """儲存格資料；檔名、工作表、欄位與型別以整數ID參照維度表"""
+    __tablename__ = "excel_cells"
+    __table_args__ = (
+        # 依檔案/工作表/欄位篩選（最左前綴亦適用於只篩選檔案的查詢與刪除）
+        Index("ix_excel_cells_file_sheet_column_row", "file_id", "sheet_id", "column_id", "row_number"),
+        # 跨檔案查詢單一欄位（例如某欄位的時間序列；以id結尾，依id分頁時不需另外排序）
+        Index("ix_excel_cells_column_id", "column_id", "id"),
+        # 數值與時間範圍篩選（搭配欄位條件時為索引範圍掃描）
+        Index("ix_excel_cells_column_num", "column_id", "value_num"),
+        Index("ix_excel_cells_column_time", "column_id", "value_time"),
+        # 只篩選檔案、工作表或型別的查詢（以id結尾，依id分頁時不需另外排序）
+        Index("ix_excel_cells_file_id", "file_id", "id"),
+        Index("ix_excel_cells_sheet_id", "sheet_id", "id"),
+        Index("ix_excel_cells_type_id", "type_id", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    filename = Column(String, index=True)
-    sheet_name = Column(String)
+    file_id = Column(Integer, ForeignKey("file_uploads.id"))
+    sheet_id = Column(Integer, ForeignKey("sheet_names.id"))
     row_number = Column(Integer)
-    column_name = Column(String)
+    column_id = Column(Integer, ForeignKey("column_names.id"))
     cell_value = Column(Text)
-    data_type = Column(String)
-    upload_time = Column(DateTime, default=datetime.utcnow)
-    file_hash = Column(String, index=True)
-    user_ip = Column(String)  # 記錄用戶IP
+    type_id = Column(Integer, ForeignKey("data_types.id"))
+    value_num = Column(Float, nullable=True)  # int/float儲存格的數值
+    value_time = Column(DateTime, nullable=True)  # 日期時間儲存格的值（UTC，不含時區）
+
+def name_pattern_index(table: str, column: str) -> Index:
+    """PostgreSQL的前綴比對（LIKE 'abc%'）在非C定序下無法使用一般索引，另建text_pattern_ops索引"""
+    return Index(f"ix_{table}_{column}_pattern", column,
+                 postgresql_ops={column: "text_pattern_ops"}).ddl_if(dialect="postgresql")
+
+class SheetName(Base):
+    __tablename__ = "sheet_names"
+    __table_args__ = (name_pattern_index("sheet_names", "name"),)
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True, nullable=False)
+
+class ColumnName(Base):
+    __tablename__ = "column_names"
+    __table_args__ = (name_pattern_index("column_names", "name"),)
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True, nullable=False)
+
+class DataType(Base):
+    __tablename__ = "data_types"
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True, nullable=False)
 
 class FileUpload(Base):
     __tablename__ = "file_uploads"
+    __table_args__ = (
+        # 檔案列表依上傳時間排序並以(upload_time, id)游標分頁
+        Index("ix_file_uploads_upload_time_id", "upload_time", "id"),
+        name_pattern_index("file_uploads", "filename"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, index=True)
@@ -82,6 +279,47 @@ class FileUpload(Base):
     status = Column(String, default="uploaded")
     error_message = Column(Text, nullable=True)
     user_ip = Column(String)  # 記錄用戶IP
+    # 增量寫入的版本鏈：同檔名的上一個版本，以及第一個版本的ID（一般上傳皆為空）
+    previous_version_id = Column(Integer, ForeignKey("file_uploads.id", ondelete="SET NULL"), nullable=True)
+    lineage_id = Column(Integer, nullable=True)
+
+class SheetTable(Base):
+    __tablename__ = "sheet_tables"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    file_id = Column(Integer, index=True)  # 對應FileUpload.id
+    sheet_name = Column(String)
+    table_name = Column(String, unique=True)
+    columns = Column(Text)  # JSON欄位描述：原始欄名、資料庫欄名、型別
+    row_count = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class SheetStat(Base):
+    __tablename__ = "sheet_stats"
+    __table_args__ = (
+        Index("ix_sheet_stats_file_sheet", "file_id", "sheet_id", unique=True),
+    )
+    
+    # 每個檔案每個工作表的儲存格數，由寫入與刪除流程維護，供 /data/stats/ 使用
+    id = Column(Integer, primary_key=True)
+    file_id = Column(Integer, ForeignKey("file_uploads.id"))
+    sheet_id = Column(Integer, ForeignKey("sheet_names.id"))
+    cell_count = Column(Integer, default=0)
+
+class RowFingerprint(Base):
+    __tablename__ = "row_fingerprints"
+    __table_args__ = (
+        Index("ix_row_fingerprints_lineage_sheet_row", "lineage_id", "sheet_id", "row_number", unique=True),
+        Index("ix_row_fingerprints_file", "file_id"),
+    )
+    
+    # 增量寫入：每個邏輯工作簿（版本鏈）各工作表每一列目前的指紋，以及持有該列儲存格的版本
+    id = Column(Integer, primary_key=True)
+    lineage_id = Column(Integer, nullable=False)
+    sheet_id = Column(Integer, ForeignKey("sheet_names.id"))
+    row_number = Column(Integer)
+    fingerprint = Column(BigInteger)
+    file_id = Column(Integer, ForeignKey("file_uploads.id"))
 
 class UserSession(Base):
     __tablename__ = "user_sessions"
@@ -94,8 +332,133 @@ class UserSession(Base):
     request_count = Column(Integer, default=0)
     is_active = Column(String, default="active")
 
-# 建立資料表
+def add_missing_columns(model, columns) -> bool:
+    """舊版資料表缺少的欄位以ALTER TABLE新增（不含外鍵限制），回傳是否有新增"""
+    existing = {column["name"] for column in inspect(engine).get_columns(model.__tablename__)}
+    missing = [column for column in columns if column.name not in existing]
+    if not missing:
+        return False
+    with engine.begin() as conn:
+        for column in missing:
+            conn.execute(text(
+                f"ALTER TABLE {model.__tablename__} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}"
+            ))
+    return True
+
+def add_typed_value_columns() -> bool:
+    """舊版excel_cells沒有value_num/value_time時新增欄位，回傳是否有新增"""
+    return add_missing_columns(ExcelData, (ExcelData.value_num, ExcelData.value_time))
+
+def backfill_typed_values() -> None:
+    """由cell_value回填數值與時間儲存格的value_num/value_time（分批提交）"""
+    db = SessionLocal()
+    try:
+        type_names = {
+            row.id: row.name for row in db.query(DataType).filter(DataType.name.in_(NUMERIC_TYPES + TIME_TYPES))
+        }
+        last_id = 0
+        filled = 0
+        while type_names:
+            rows = (
+                db.query(ExcelData.id, ExcelData.cell_value, ExcelData.type_id)
+                .filter(ExcelData.type_id.in_(list(type_names)), ExcelData.id > last_id)
+                .order_by(ExcelData.id)
+                .limit(INGEST_BATCH_SIZE)
+                .all()
+            )
+            if not rows:
+                break
+            updates = []
+            for row in rows:
+                value_num, value_time = parse_typed_value(row.cell_value, type_names[row.type_id])
+                updates.append({"id": row.id, "value_num": value_num, "value_time": value_time})
+            db.execute(update(ExcelData), updates)
+            db.commit()
+            last_id = rows[-1].id
+            filled += len(rows)
+        logger.info(f"已回填 {filled} 筆儲存格的數值/時間欄位")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"回填數值/時間欄位時發生錯誤: {str(e)}")
+    finally:
+        db.close()
+
+# 建立資料表（既有資料表缺少的欄位與索引也一併補建）
 Base.metadata.create_all(bind=engine)
+typed_columns_added = add_typed_value_columns()
+add_missing_columns(FileUpload, (FileUpload.previous_version_id, FileUpload.lineage_id))
+for model in (ExcelData, FileUpload, SheetName, ColumnName):
+    for index in model.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+with engine.begin() as conn:
+    # 已由 ix_excel_cells_column_id 取代
+    conn.execute(text("DROP INDEX IF EXISTS ix_excel_cells_column_file"))
+
+def migrate_legacy_excel_data():
+    """將舊版excel_data（每格重複儲存字串）轉入正規化結構，完成後改名為excel_data_legacy"""
+    if "excel_data" not in inspect(engine).get_table_names():
+        return
+    
+    logger.info("偵測到舊版excel_data資料表，開始轉換為正規化結構")
+    try:
+        with engine.begin() as conn:
+            for table, column in (("sheet_names", "sheet_name"), ("column_names", "column_name"), ("data_types", "data_type")):
+                conn.execute(text(
+                    f"INSERT INTO {table} (name) SELECT DISTINCT {column} FROM excel_data "
+                    f"WHERE {column} IS NOT NULL AND {column} NOT IN (SELECT name FROM {table})"
+                ))
+            conn.execute(text(
+                "INSERT INTO excel_cells (file_id, sheet_id, row_number, column_id, cell_value, type_id) "
+                "SELECT f.id, s.id, d.row_number, c.id, d.cell_value, t.id FROM excel_data d "
+                "JOIN file_uploads f ON f.file_hash = d.file_hash "
+                "JOIN sheet_names s ON s.name = d.sheet_name "
+                "JOIN column_names c ON c.name = d.column_name "
+                "JOIN data_types t ON t.name = d.data_type "
+                "ORDER BY d.id"
+            ))
+            conn.execute(text("ALTER TABLE excel_data RENAME TO excel_data_legacy"))
+        backfill_typed_values()
+    except Exception as e:
+        logger.error(f"轉換舊版excel_data時發生錯誤: {str(e)}")
+
+migrate_legacy_excel_data()
+if typed_columns_added:
+    backfill_typed_values()
+
+def recompute_sheet_stats(db: Session) -> None:
+    """由excel_cells重新計算sheet_stats（不提交）
+    
+    只以寬表儲存的檔案（STORAGE_MODE=wide）沒有儲存格可重新計算，保留寫入時記錄的統計。
+    """
+    wide_only = db.query(SheetTable.file_id).filter(~exists().where(ExcelData.file_id == SheetTable.file_id))
+    db.query(SheetStat).filter(~SheetStat.file_id.in_(wide_only)).delete(synchronize_session=False)
+    db.execute(SheetStat.__table__.insert().from_select(
+        ["file_id", "sheet_id", "cell_count"],
+        db.query(ExcelData.file_id, ExcelData.sheet_id, func.count(ExcelData.id))
+        .group_by(ExcelData.file_id, ExcelData.sheet_id)
+        .statement
+    ))
+
+def ensure_sheet_stats():
+    """統計表為空但已有儲存格資料時（由舊版升級），重新計算一次"""
+    db = SessionLocal()
+    try:
+        if db.query(SheetStat.id).first() is None and db.query(ExcelData.id).first() is not None:
+            logger.info("sheet_stats 為空，由 excel_cells 重新計算統計資料")
+            recompute_sheet_stats(db)
+            db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"計算統計資料時發生錯誤: {str(e)}")
+    finally:
+        db.close()
+
+ensure_sheet_stats()
+
+# 維度表名稱對照快取
+sheet_names = DimensionCache(SheetName.__table__)
+column_names = DimensionCache(ColumnName.__table__)
+data_types = DimensionCache(DataType.__table__)
 
 # Pydantic模型
 class ExcelDataResponse(BaseModel):
@@ -106,6 +469,8 @@ class ExcelDataResponse(BaseModel):
     column_name: str
     cell_value: str
     data_type: str
+    value_num: Optional[float] = None
+    value_time: Optional[datetime] = None
     upload_time: datetime
     
     model_config = {"from_attributes": True}
@@ -118,16 +483,53 @@ class FileUploadResponse(BaseModel):
     file_hash: str
     status: str
     error_message: Optional[str] = None
+    previous_version_id: Optional[int] = None
     
     model_config = {"from_attributes": True}
 
+class JobStatusResponse(BaseModel):
+    job_id: int
+    filename: str
+    status: str
+    sheets_total: Optional[int] = None
+    sheets_done: Optional[int] = None
+    cells_written: Optional[int] = None
+    cells_per_second: Optional[float] = None
+    elapsed_seconds: Optional[float] = None
+    sheet_errors: Dict[str, str] = {}
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class SheetColumn(BaseModel):
+    name: str
+    type: str
+
+class SheetTableResponse(BaseModel):
+    sheet_name: str
+    row_count: int
+    columns: List[SheetColumn]
+
+class BulkDeleteRequest(BaseModel):
+    file_ids: List[int]
+
 class DataQuery(BaseModel):
     filename: Optional[str] = None
+    file_hash: Optional[str] = None
     sheet_name: Optional[str] = None
     column_name: Optional[str] = None
     data_type: Optional[str] = None
+    value_min: Optional[float] = None  # 數值範圍（value_num，包含端點）
+    value_max: Optional[float] = None
+    time_from: Optional[datetime] = None  # 時間範圍（value_time，UTC，包含端點）
+    time_to: Optional[datetime] = None
+    match: str = "prefix"  # 名稱比對方式：exact、prefix（可使用索引）或 contains（子字串，需掃描）
     limit: int = 100
-    offset: int = 0
+    offset: int = 0  # 舊版分頁方式，深層分頁較慢；建議改用cursor
+    cursor: Optional[str] = None  # 上一頁回應標頭X-Next-Cursor的值，指定時忽略offset
+
+MATCH_MODES = ("exact", "prefix", "contains")
 
 # 依賴注入
 def get_db():
@@ -137,52 +539,66 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # 安全設定
 security = HTTPBearer()
 
 # 速率限制檢查
-def check_rate_limit(request: Request, db: Session):
+async def check_rate_limit(request: Request) -> RateLimitDecision:
     client_ip = request.client.host
-    current_time = datetime.utcnow()
     
-    # 檢查或建立會話
-    session = db.query(UserSession).filter(
-        UserSession.user_ip == client_ip,
-        UserSession.is_active == "active"
-    ).first()
+    if rate_limiter.blocking:
+        decision = await run_in_threadpool(rate_limiter.hit, client_ip)
+    else:
+        decision = rate_limiter.hit(client_ip)
+    rate_limit_decisions_total.inc(result="allowed" if decision.allowed else "blocked")
     
-    if not session:
-        # 建立新會話
-        session_token = secrets.token_urlsafe(32)
-        session = UserSession(
-            session_token=session_token,
-            user_ip=client_ip,
-            created_at=current_time,
-            last_activity=current_time,
-            request_count=1
+    if not decision.allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="請求過於頻繁，請稍後再試",
+            headers={"Retry-After": str(int(decision.retry_after) + 1)}
         )
-        db.add(session)
-        db.commit()
-    else:
-        # 檢查速率限制
-        if session.request_count >= RATE_LIMIT_REQUESTS:
-            time_diff = current_time - session.last_activity
-            if time_diff.total_seconds() < RATE_LIMIT_WINDOW:
-                raise HTTPException(
-                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    detail="請求過於頻繁，請稍後再試"
-                )
+    
+    session_audit.record(client_ip)
+    return decision
+
+def flush_session_audit(activity: Dict[str, Tuple[int, datetime]]) -> None:
+    """將累積的請求次數批次寫入UserSession（僅供稽核，不影響速率限制）"""
+    db = SessionLocal()
+    try:
+        sessions = {
+            s.user_ip: s for s in db.query(UserSession).filter(
+                UserSession.user_ip.in_(list(activity)),
+                UserSession.is_active == "active"
+            )
+        }
+        for client_ip, (count, last_activity) in activity.items():
+            session = sessions.get(client_ip)
+            if not session:
+                db.add(UserSession(
+                    session_token=secrets.token_urlsafe(32),
+                    user_ip=client_ip,
+                    created_at=last_activity,
+                    last_activity=last_activity,
+                    request_count=count
+                ))
+            elif (last_activity - session.last_activity).total_seconds() >= RATE_LIMIT_WINDOW:
+                # 超過時間窗，重新計數
+                session.request_count = count
+                session.last_activity = last_activity
             else:
-                # 重置計數器
-                session.request_count = 1
-                session.last_activity = current_time
-        else:
-            session.request_count += 1
-            session.last_activity = current_time
-        
+                session.request_count += count
+                session.last_activity = last_activity
         db.commit()
-    
-    return session
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
 
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security), request: Request = None):
     # 從環境變數取得API金鑰
@@ -195,15 +611,26 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security),
         )
     return credentials.credentials
 
+def verify_admin_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    # 管理功能使用獨立的金鑰，未設定時停用
+    if not os.getenv("ADMIN_API_KEY"):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="未設定管理金鑰，管理功能已停用")
+    if not is_admin_key(credentials.credentials):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="無效的管理金鑰",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return credentials.credentials
+
 # 檔案安全檢查
-def validate_file(file: UploadFile):
+def validate_file(filename: str, allowed_extensions: List[str] = EXCEL_EXTENSIONS):
     # 檢查檔案名稱
-    if not file.filename:
+    if not filename:
         raise HTTPException(status_code=400, detail="檔案名稱不能為空")
     
     # 檢查檔案副檔名
-    allowed_extensions = ['.xlsx', '.xls']
-    file_ext = Path(file.filename).suffix.lower()
+    file_ext = Path(filename).suffix.lower()
     if file_ext not in allowed_extensions:
         raise HTTPException(
             status_code=400, 
@@ -211,7 +638,7 @@ def validate_file(file: UploadFile):
         )
     
     # 檢查檔案名稱安全性
-    if not re.match(r'^[a-zA-Z0-9._-]+$', file.filename):
+    if not re.match(r'^[a-zA-Z0-9._-]+$', filename):
         raise HTTPException(
             status_code=400, 
             detail="檔案名稱包含不安全的字符"
@@ -223,6 +650,49 @@ def validate_file(file: UploadFile):
 def calculate_file_hash(content: bytes) -> str:
     return hashlib.sha256(content).hexdigest()
 
+def open_workbook(source: Union[bytes, StoredUpload]) -> readers.Workbook:
+    """開啟工作簿（讀取後端依EXCEL_READER）：暫存檔由路徑直接讀取"""
+    with upload_stage_seconds.time(stage="workbook_open"):
+        if isinstance(source, StoredUpload):
+            return readers.open_workbook(source.path)
+        return readers.open_workbook(source)
+
+def find_duplicate(db: Session, file_hash: str) -> Optional[Dict[str, Any]]:
+    """檢查檔案是否已經上傳過（先查記憶體快取，再查資料庫）"""
+    with upload_stage_seconds.time(stage="duplicate_check"):
+        file_id = recent_file_hashes.get(file_hash)
+        if file_id is None:
+            file_id = db.query(FileUpload.id).filter(FileUpload.file_hash == file_hash).scalar()
+            if file_id is None:
+                return None
+            recent_file_hashes.set(file_hash, file_id)
+    
+    return {
+        "status": "duplicate",
+        "message": "檔案已經上傳過",
+        "file_id": file_id
+    }
+
+def find_duplicates(db: Session, file_hashes: Iterable[str]) -> Dict[str, int]:
+    """一次檢查多個雜湊值，回傳已上傳過者的 雜湊值 -> FileUpload.id"""
+    found: Dict[str, int] = {}
+    with upload_stage_seconds.time(stage="duplicate_check"):
+        missing = []
+        for file_hash in set(file_hashes):
+            file_id = recent_file_hashes.get(file_hash)
+            if file_id is None:
+                missing.append(file_hash)
+            else:
+                found[file_hash] = file_id
+        for start in range(0, len(missing), IN_CLAUSE_CHUNK):
+            rows = db.query(FileUpload.file_hash, FileUpload.id).filter(
+                FileUpload.file_hash.in_(missing[start:start + IN_CLAUSE_CHUNK])
+            )
+            for file_hash, file_id in rows:
+                found[file_hash] = file_id
+                recent_file_hashes.set(file_hash, file_id)
+    return found
+
 def sanitize_filename(filename: str) -> str:
     """清理檔案名稱，移除不安全字符"""
     # 移除路徑分隔符和特殊字符
@@ -233,107 +703,682 @@ def sanitize_filename(filename: str) -> str:
         filename = name[:95] + ext
     return filename
 
-def process_excel_file(file_content: bytes, filename: str, db: Session, user_ip: str) -> Dict[str, Any]:
-    """處理Excel檔案並儲存到資料庫"""
+def process_excel_file(file_content: Union[bytes, StoredUpload], filename: str, db: Session, user_ip: str,
+                       file_hash: Optional[str] = None, delta: bool = False) -> Dict[str, Any]:
+    """處理Excel檔案並儲存到資料庫（file_content可為位元組內容或已寫入暫存檔的上傳）"""
     try:
         # 檢查檔案大小
-        if len(file_content) > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=413,
-                detail=f"檔案大小超過限制 ({MAX_FILE_SIZE / 1024 / 1024:.1f}MB)"
-            )
+        if isinstance(file_content, StoredUpload):
+            file_size = file_content.size
+            file_hash = file_hash or file_content.file_hash
+        else:
+            file_size = len(file_content)
+        if file_size > MAX_FILE_SIZE:
+            raise file_too_large_error()
         
         # 清理檔案名稱
         safe_filename = sanitize_filename(filename)
         
-        # 讀取Excel檔案
-        excel_file = pd.ExcelFile(io.BytesIO(file_content))
+        # 計算檔案雜湊值（上傳時已增量計算者直接沿用）
+        if file_hash is None:
+            with upload_stage_seconds.time(stage="hash"):
+                file_hash = calculate_file_hash(file_content)
         
-        # 計算檔案雜湊值
-        file_hash = calculate_file_hash(file_content)
+        # 檢查檔案是否已經上傳過（在解析工作簿之前）
+        duplicate = find_duplicate(db, file_hash)
+        if duplicate:
+            return duplicate
         
-        # 檢查檔案是否已經上傳過
-        existing_file = db.query(FileUpload).filter(FileUpload.file_hash == file_hash).first()
-        if existing_file:
-            return {
-                "status": "duplicate",
-                "message": "檔案已經上傳過",
-                "file_id": existing_file.id
-            }
-        
-        # 建立檔案上傳記錄
-        file_upload = FileUpload(
-            filename=safe_filename,
-            file_size=len(file_content),
-            file_hash=file_hash,
-            status="processing",
-            user_ip=user_ip
-        )
-        db.add(file_upload)
-        db.flush()
+        # 讀取Excel檔案
+        with open_workbook(file_content) as excel_file:
+            # 建立檔案上傳記錄
+            file_upload = FileUpload(
+                filename=safe_filename,
+                file_size=file_size,
+                file_hash=file_hash,
+                status="processing",
+                user_ip=user_ip
+            )
+            db.add(file_upload)
+            db.flush()
+            
+            job = upload_jobs.create(file_upload.id, safe_filename, status="processing")
+            return ingest_workbook(excel_file, file_upload, db, job, delta=delta)
         
-        total_rows = 0
+    except Exception as e:
+        logger.error(f"處理檔案時發生錯誤: {str(e)}")
+        if 'file_upload' in locals():
+            file_upload.status = "error"
+            file_upload.error_message = str(e)
+            db.commit()
+            response_cache.invalidate()
+        if 'job' in locals():
+            job.fail(str(e))
         
-        # 處理每個工作表
-        for sheet_name in excel_file.sheet_names:
-            try:
-                df = pd.read_excel(excel_file, sheet_name=sheet_name)
-                
-                # 限制處理的行數（防止記憶體溢出）
-                max_rows = 10000
-                if len(df) > max_rows:
-                    df = df.head(max_rows)
-                    logger.warning(f"工作表 {sheet_name} 超過 {max_rows} 行，只處理前 {max_rows} 行")
-                
-                # 處理每一行資料
-                for row_idx, row in df.iterrows():
-                    for col_name, cell_value in row.items():
-                        if pd.notna(cell_value):  # 只儲存非空值
-                            # 限制儲存格值長度
-                            cell_str = str(cell_value)
-                            if len(cell_str) > 1000:
-                                cell_str = cell_str[:1000] + "..."
-                            
-                            excel_data = ExcelData(
-                                filename=safe_filename,
-                                sheet_name=sheet_name,
-                                row_number=row_idx + 1,
-                                column_name=str(col_name),
-                                cell_value=cell_str,
-                                data_type=str(type(cell_value).__name__),
-                                file_hash=file_hash,
-                                user_ip=user_ip
+        raise HTTPException(
+            status_code=400,
+            detail=f"處理檔案時發生錯誤: {str(e)}"
+        )
+
+def limit_sheet_rows(frames: Iterable[pd.DataFrame], sheet_name: str,
+                     truncated: Dict[str, int]) -> Iterator[pd.DataFrame]:
+    """套用MAX_SHEET_ROWS：truncate時截斷並記錄於truncated，reject時拋出例外"""
+    kept = 0
+    for df in frames:
+        if MAX_SHEET_ROWS and kept + len(df) > MAX_SHEET_ROWS:
+            if MAX_SHEET_ROWS_POLICY == "reject":
+                raise ValueError(f"工作表超過 {MAX_SHEET_ROWS} 行的上限")
+            df = df.head(MAX_SHEET_ROWS - kept)
+            truncated[sheet_name] = MAX_SHEET_ROWS
+            logger.warning(f"工作表 {sheet_name} 超過 {MAX_SHEET_ROWS} 行，只處理前 {MAX_SHEET_ROWS} 行")
+            yield df
+            return
+        kept += len(df)
+        yield df
+
+def ingest_workbook(excel_file: readers.Workbook, file_upload: FileUpload,
+                    db: Session, job: UploadJob, commit: bool = True, delta: bool = False) -> Dict[str, Any]:
+    """將工作簿的每個工作表寫入資料庫，完成後更新檔案狀態並提交
+    
+    eav模式依INGEST_CHUNK_ROWS串流讀取工作表，每段資料各自展開並批次寫入，
+    記憶體用量不隨工作表列數增加。
+    commit為False時（批次上傳）不提交也不將工作標示為完成，由呼叫端整組提交後處理。
+    delta為True時只寫入與同檔名上一版相比新增或變更的列（見DeltaIngest）。
+    """
+    total_rows = 0
+    ingest_seconds = 0.0
+    truncated: Dict[str, int] = {}
+    chunk_rows = INGEST_CHUNK_ROWS if STORAGE_MODE == "eav" else 0
+    job.start(len(excel_file.sheet_names))
+    sheet_ids = sheet_names.resolve(db, excel_file.sheet_names)
+    delta_ingest = DeltaIngest(db, file_upload) if delta else None
+    
+    # 處理每個工作表
+    for sheet_index, (sheet_name, load_sheet) in enumerate(excel_file.sheets(chunk_rows)):
+        try:
+            sheet_cells = 0
+            
+            # 每個工作表在savepoint中寫入，失敗時不留下部分資料，統計數字與儲存格一致
+            with db.begin_nested():
+                if delta_ingest:
+                    delta_ingest.start_sheet(sheet_ids[sheet_name])
+                frames = upload_stage_seconds.time_iter(load_sheet(), stage="sheet_parse")
+                for df in limit_sheet_rows(frames, sheet_name, truncated):
+                    # 吞吐量只計算展開與寫入，不含解析工作表的時間
+                    started = time.perf_counter()
+                    
+                    # 寬表：整個工作表一張具型別的資料表
+                    if STORAGE_MODE in ("wide", "both"):
+                        with upload_stage_seconds.time(stage="db_flush"):
+                            cell_count = store_wide_sheet(db, file_upload, sheet_index, sheet_name, df)
+                        if STORAGE_MODE == "wide":
+                            # 沒有excel_cells時以寬表的非空儲存格數記錄統計
+                            sheet_cells += cell_count
+                            job.add_cells(cell_count)
+                    
+                    # EAV：向量化展開非空儲存格，名稱換成維度表ID後批次寫入
+                    if STORAGE_MODE in ("eav", "both"):
+                        with upload_stage_seconds.time(stage="row_expansion"):
+                            cells = frame_to_cells(df)
+                            if delta_ingest:
+                                cells = delta_ingest.changed_cells(cells)
+                            column_ids = column_names.resolve(db, cells["column_name"].unique())
+                            type_ids = data_types.resolve(db, cells["data_type"].unique())
+                            encoded = encode_cells(cells, column_ids, type_ids)
+                        with upload_stage_seconds.time(stage="db_flush"):
+                            sheet_cells += bulk_insert(
+                                db,
+                                ExcelData.__table__,
+                                iter_cell_records(encoded, file_id=file_upload.id, sheet_id=sheet_ids[sheet_name]),
+                                INGEST_BATCH_SIZE,
+                                on_batch=job.add_cells
                             )
-                            db.add(excel_data)
-                            total_rows += 1
-                            
-            except Exception as e:
-                logger.error(f"處理工作表 {sheet_name} 時發生錯誤: {str(e)}")
-                continue
-        
-        # 更新檔案狀態
-        file_upload.status = "completed"
+                    ingest_seconds += time.perf_counter() - started
+                if delta_ingest:
+                    delta_ingest.finish_sheet()
+                if sheet_cells:
+                    db.add(SheetStat(file_id=file_upload.id, sheet_id=sheet_ids[sheet_name], cell_count=sheet_cells))
+                total_rows += sheet_cells
+            job.sheet_done(sheet_name)
+            
+        except Exception as e:
+            logger.error(f"處理工作表 {sheet_name} 時發生錯誤: {str(e)}")
+            job.sheet_done(sheet_name, error=str(e))
+            continue
+    
+    if delta_ingest:
+        # 寫入失敗的工作表仍在工作簿中，不視為移除
+        with db.begin_nested():
+            delta_ingest.remove_missing_sheets(sheet_ids.values())
+    
+    # 更新檔案狀態
+    file_upload.status = "completed"
+    if commit:
+        started = time.perf_counter()
         db.commit()
+        commit_seconds = time.perf_counter() - started
+        upload_stage_seconds.observe(commit_seconds, stage="commit")
+        ingest_seconds += commit_seconds
+        response_cache.invalidate()
+        recent_file_hashes.set(file_upload.file_hash, file_upload.id)
+    
+    cells_per_second = report_throughput(file_upload.filename, total_rows, ingest_seconds)
+    ingest_cells_total.inc(total_rows)
+    ingest_seconds_total.inc(ingest_seconds)
+    ingest_cells_per_second.set(cells_per_second)
+    
+    result = {
+        "status": "success",
+        "message": f"成功處理檔案，共儲存 {total_rows} 筆資料",
+        "file_id": file_upload.id,
+        "total_rows": total_rows,
+        "sheets": excel_file.sheet_names,
+        "cells_per_second": round(cells_per_second, 1)
+    }
+    if truncated:
+        result["truncated_sheets"] = truncated
+    if delta_ingest:
+        result["delta"] = delta_ingest.summary()
+    if commit:
+        job.complete(result)
+    return result
+
+def lock_lineage(db: Session, file_upload: FileUpload) -> None:
+    """同一檔名的增量寫入依序進行，鎖定到交易結束（避免兩個上傳依同一份舊指紋寫入）
+    
+    PostgreSQL使用交易層級的advisory lock；SQLite以寫入上傳記錄取得資料庫的寫入鎖，
+    之後讀取的指紋都包含前一個交易提交的結果。
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        key = int.from_bytes(hashlib.sha256(file_upload.filename.encode("utf-8")).digest()[:8], "big", signed=True)
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": key})
+    else:
+        db.query(FileUpload).filter(FileUpload.id == file_upload.id).update(
+            {FileUpload.status: "processing"}, synchronize_session=False
+        )
+
+def lineage_file_ids(db: Session, file_ids: List[int]) -> List[int]:
+    """加入各檔案所屬增量版本鏈的所有版本
+    
+    版本鏈中每一列只有最新指紋所屬的版本保有儲存格（舊版本的儲存格在同一交易中刪除），
+    因此整條鏈的儲存格合起來即為最新版工作簿的完整內容。
+    """
+    lineage_ids = [row[0] for row in db.query(FileUpload.lineage_id).filter(
+        FileUpload.id.in_(file_ids), FileUpload.lineage_id.isnot(None)
+    ).distinct()]
+    if not lineage_ids:
+        return file_ids
+    members = {row[0] for row in db.query(FileUpload.id).filter(FileUpload.lineage_id.in_(lineage_ids))}
+    return sorted(members.union(file_ids))
+
+class DeltaIngest:
+    """增量寫入：與同檔名上一版的列指紋比對，只寫入新增或變更的列
+    
+    同一檔名以delta方式上傳的各版本構成版本鏈（FileUpload.previous_version_id / lineage_id），
+    row_fingerprints記錄鏈中每一列目前的指紋與持有其儲存格的版本。變更的列先刪除舊版本的
+    儲存格再寫入；上一版有、本版已無資料的列（包含整個被移除的工作表）也一併刪除，使整條
+    版本鏈的資料與最新的工作簿一致，依檔名或鏈中任一版本的雜湊值查詢即可取得完整內容。
+    同檔名的上一版是一般（完整）上傳時，以其儲存格建立指紋並成為版本鏈的第一個版本。
+    工作簿仍需完整解析，但寫入量只與變動的列數有關。
+    """
+    
+    def __init__(self, db: Session, file_upload: FileUpload):
+        self.db = db
+        self.file_id = file_upload.id
+        lock_lineage(db, file_upload)
+        previous = (
+            db.query(FileUpload.id, FileUpload.lineage_id)
+            .filter(
+                FileUpload.filename == file_upload.filename,
+                FileUpload.status == "completed",
+                FileUpload.id != file_upload.id
+            )
+            .order_by(FileUpload.id.desc())
+            .first()
+        )
+        if previous is not None and previous.lineage_id is None:
+            if db.query(SheetTable.id).filter(SheetTable.file_id == previous.id).first():
+                raise ValueError("同檔名的上一版以寬表儲存，無法增量上傳")
+            self.adopt(previous.id)
+        file_upload.previous_version_id = previous.id if previous else None
+        file_upload.lineage_id = (previous.lineage_id or previous.id) if previous else file_upload.id
+        self.previous_version_id = file_upload.previous_version_id
+        self.lineage_id = file_upload.lineage_id
+        self.counts = {"rows_added": 0, "rows_changed": 0, "rows_unchanged": 0, "rows_removed": 0}
+        self.sheets_removed: List[str] = []
+        self.sheet_id: Optional[int] = None
+        self.known: Dict[int, Any] = {}
+        self.seen: set = set()
+        self.sheet_counts = dict.fromkeys(self.counts, 0)
+    
+    def adopt(self, file_id: int) -> None:
+        """將一般上傳的檔案設為版本鏈的第一個版本：逐工作表由已儲存的儲存格計算列指紋"""
+        self.db.query(FileUpload).filter(FileUpload.id == file_id).update(
+            {FileUpload.lineage_id: file_id}, synchronize_session=False
+        )
+        sheet_ids = [row[0] for row in self.db.query(SheetStat.sheet_id).filter(
+            SheetStat.file_id == file_id, SheetStat.cell_count > 0
+        )]
+        for sheet_id in sheet_ids:
+            stored = pd.DataFrame(
+                self.db.query(ExcelData.row_number, ExcelData.column_id, ExcelData.cell_value, ExcelData.type_id)
+                .filter(ExcelData.file_id == file_id, ExcelData.sheet_id == sheet_id).all(),
+                columns=["row_number", "column_id", "cell_value", "type_id"]
+            )
+            stored["column_name"] = stored["column_id"].map(column_names.name_of(self.db, stored["column_id"].unique().tolist()))
+            stored["data_type"] = stored["type_id"].map(data_types.name_of(self.db, stored["type_id"].unique().tolist()))
+            fingerprints = row_fingerprints(stored)
+            bulk_insert(self.db, RowFingerprint.__table__, (
+                {"lineage_id": file_id, "sheet_id": sheet_id, "row_number": row_number,
+                 "fingerprint": fingerprint, "file_id": file_id}
+                for row_number, fingerprint in zip(fingerprints.index.tolist(), fingerprints.tolist())
+            ), INGEST_BATCH_SIZE)
+    
+    def start_sheet(self, sheet_id: int) -> None:
+        """載入工作表在版本鏈中目前的列指紋"""
+        self.sheet_id = sheet_id
+        self.known = {
+            row.row_number: row for row in self.db.query(
+                RowFingerprint.id, RowFingerprint.row_number, RowFingerprint.fingerprint, RowFingerprint.file_id
+            ).filter(RowFingerprint.lineage_id == self.lineage_id, RowFingerprint.sheet_id == sheet_id)
+        }
+        self.seen = set()
+        self.sheet_counts = dict.fromkeys(self.counts, 0)
+    
+    def changed_cells(self, cells: pd.DataFrame) -> pd.DataFrame:
+        """比對一段資料的列指紋，更新指紋並移除被取代的舊儲存格，回傳需要寫入的儲存格"""
+        added: List[Dict[str, Any]] = []
+        changed: List[Dict[str, Any]] = []
+        superseded: Dict[int, List[int]] = {}
+        fingerprints = row_fingerprints(cells)
+        for row_number, fingerprint in zip(fingerprints.index.tolist(), fingerprints.tolist()):
+            self.seen.add(row_number)
+            known = self.known.get(row_number)
+            if known is None:
+                added.append({
+                    "lineage_id": self.lineage_id,
+                    "sheet_id": self.sheet_id,
+                    "row_number": row_number,
+                    "fingerprint": fingerprint,
+                    "file_id": self.file_id
+                })
+            elif known.fingerprint != fingerprint:
+                changed.append({"id": known.id, "fingerprint": fingerprint, "file_id": self.file_id})
+                superseded.setdefault(known.file_id, []).append(row_number)
         
+        self.remove_rows(superseded)
+        if changed:
+            self.db.execute(update(RowFingerprint), changed)
+        if added:
+            bulk_insert(self.db, RowFingerprint.__table__, iter(added), INGEST_BATCH_SIZE)
+        self.sheet_counts["rows_added"] += len(added)
+        self.sheet_counts["rows_changed"] += len(changed)
+        self.sheet_counts["rows_unchanged"] += len(fingerprints) - len(added) - len(changed)
+        
+        rows = {record["row_number"] for record in added}
+        rows.update(row_number for row_numbers in superseded.values() for row_number in row_numbers)
+        return cells[cells["row_number"].isin(rows)]
+    
+    def finish_sheet(self) -> None:
+        """刪除上一版有、本版已無資料的列（工作表寫入成功時才計入結果）"""
+        removed = [known for row_number, known in self.known.items() if row_number not in self.seen]
+        rows_by_file: Dict[int, List[int]] = {}
+        for known in removed:
+            rows_by_file.setdefault(known.file_id, []).append(known.row_number)
+        self.remove_rows(rows_by_file)
+        ids = [known.id for known in removed]
+        for start in range(0, len(ids), IN_CLAUSE_CHUNK):
+            self.db.query(RowFingerprint).filter(
+                RowFingerprint.id.in_(ids[start:start + IN_CLAUSE_CHUNK])
+            ).delete(synchronize_session=False)
+        self.sheet_counts["rows_removed"] += len(removed)
+        for key, count in self.sheet_counts.items():
+            self.counts[key] += count
+    
+    def remove_rows(self, rows_by_file: Dict[int, List[int]]) -> None:
+        """刪除舊版本中指定列的儲存格，並扣除該版本的統計數"""
+        for file_id, row_numbers in rows_by_file.items():
+            removed = 0
+            for start in range(0, len(row_numbers), IN_CLAUSE_CHUNK):
+                removed += self.db.query(ExcelData).filter(
+                    ExcelData.file_id == file_id,
+                    ExcelData.sheet_id == self.sheet_id,
+                    ExcelData.row_number.in_(row_numbers[start:start + IN_CLAUSE_CHUNK])
+                ).delete(synchronize_session=False)
+            if removed:
+                self.db.query(SheetStat).filter(
+                    SheetStat.file_id == file_id, SheetStat.sheet_id == self.sheet_id
+                ).update({SheetStat.cell_count: SheetStat.cell_count - removed}, synchronize_session=False)
+    
+    def remove_missing_sheets(self, present_sheet_ids: Iterable[int]) -> None:
+        """版本鏈中有、本版工作簿已沒有的工作表：刪除其所有列並記錄於sheets_removed"""
+        missing = [row[0] for row in self.db.query(RowFingerprint.sheet_id).filter(
+            RowFingerprint.lineage_id == self.lineage_id,
+            RowFingerprint.sheet_id.notin_(list(present_sheet_ids))
+        ).distinct()]
+        for sheet_id in missing:
+            self.start_sheet(sheet_id)
+            self.finish_sheet()
+        self.sheets_removed = sorted(sheet_names.name_of(self.db, missing).values())
+    
+    def summary(self) -> Dict[str, Any]:
         return {
-            "status": "success",
-            "message": f"成功處理檔案，共儲存 {total_rows} 筆資料",
-            "file_id": file_upload.id,
-            "total_rows": total_rows,
-            "sheets": excel_file.sheet_names
+            "previous_version_id": self.previous_version_id,
+            "lineage_id": self.lineage_id,
+            **self.counts,
+            "sheets_removed": self.sheets_removed
         }
+
+def store_wide_sheet(db: Session, file_upload: FileUpload, sheet_index: int, sheet_name: str, df: pd.DataFrame) -> int:
+    """將工作表寫入寬表並登記於sheet_tables，回傳非空儲存格數"""
+    table_name = wide_table_name(file_upload.id, sheet_index)
+    columns = describe_columns(df)
+    table = create_wide_table(db, table_name, df)
+    bulk_insert(db, table, iter_wide_records(df, columns), INGEST_BATCH_SIZE)
+    db.add(SheetTable(
+        file_id=file_upload.id,
+        sheet_name=sheet_name,
+        table_name=table_name,
+        columns=json.dumps(columns, ensure_ascii=False),
+        row_count=len(df)
+    ))
+    return int(df.notna().to_numpy().sum())
+
+def drop_wide_sheets(db: Session, file_id: int) -> None:
+    """刪除檔案的所有寬表及其登記（不提交交易）"""
+    for sheet_table in db.query(SheetTable).filter(SheetTable.file_id == file_id).all():
+        drop_wide_table(db, sheet_table.table_name)
+        db.delete(sheet_table)
+
+def delete_cells_in_chunks(db: Session, file_id: int, chunk_size: int,
+                           on_chunk: Optional[Callable[[int], None]] = None) -> int:
+    """依file_id索引分段刪除儲存格，每段各自提交，回傳刪除筆數"""
+    removed = 0
+    while True:
+        ids = [row[0] for row in db.query(ExcelData.id).filter(ExcelData.file_id == file_id).limit(chunk_size)]
+        if not ids:
+            return removed
+        db.query(ExcelData).filter(ExcelData.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        removed += len(ids)
+        if on_chunk:
+            on_chunk(len(ids))
+
+def remove_files(file_ids: List[int], job: Optional[DeleteJob] = None) -> Dict[str, Any]:
+    """以獨立的資料庫連線刪除檔案及其資料
+    
+    先將檔案標記為deleting並移除統計，再逐檔分段刪除儲存格，最後刪除寬表與檔案記錄。
+    中途失敗時檔案維持deleting狀態，再次刪除即可從中斷處繼續。
+    """
+    db = SessionLocal()
+    try:
+        if job:
+            job.start()
+        files = db.query(FileUpload).filter(FileUpload.id.in_(file_ids)).order_by(FileUpload.id).all()
+        found = [f.id for f in files]
+        for file_upload in files:
+            file_upload.status = "deleting"
+        db.query(SheetStat).filter(SheetStat.file_id.in_(found)).delete(synchronize_session=False)
+        db.commit()
+        response_cache.invalidate()
         
+        rows_removed = 0
+        for file_upload in files:
+            rows_removed += delete_cells_in_chunks(db, file_upload.id, DELETE_CHUNK_SIZE, job.add_rows if job else None)
+            drop_wide_sheets(db, file_upload.id)
+            # 增量版本：移除該版本持有的列指紋，下次增量上傳時這些列會重新寫入
+            db.query(RowFingerprint).filter(RowFingerprint.file_id == file_upload.id).delete(synchronize_session=False)
+            db.query(FileUpload).filter(FileUpload.previous_version_id == file_upload.id).update(
+                {FileUpload.previous_version_id: None}, synchronize_session=False
+            )
+            db.delete(file_upload)
+            db.commit()
+            response_cache.invalidate()
+            recent_file_hashes.discard(file_upload.file_hash)
+            if job:
+                job.file_done()
+        
+        result = {
+            "deleted": found,
+            "not_found": [file_id for file_id in file_ids if file_id not in found],
+            "rows_removed": rows_removed
+        }
+        if job:
+            job.complete(result)
+        return result
     except Exception as e:
-        logger.error(f"處理檔案時發生錯誤: {str(e)}")
-        if 'file_upload' in locals():
+        db.rollback()
+        logger.error(f"刪除檔案 {file_ids} 時發生錯誤: {str(e)}")
+        if job:
+            job.fail(str(e))
+        raise
+    finally:
+        db.close()
+
+def run_upload_job(job_id: int, upload: StoredUpload, delta: bool = False) -> None:
+    """背景工作：處理已登記（queued）的上傳檔案，結果寫回FileUpload狀態，完成後刪除暫存檔"""
+    job = upload_jobs.get(job_id)
+    db = SessionLocal()
+    try:
+        file_upload = db.get(FileUpload, job_id)
+        file_upload.status = "processing"
+        db.commit()
+        response_cache.invalidate()
+        
+        with open_workbook(upload) as excel_file:
+            ingest_workbook(excel_file, file_upload, db, job, delta=delta)
+    except Exception as e:
+        logger.error(f"背景處理檔案 {job_id} 時發生錯誤: {str(e)}")
+        db.rollback()
+        file_upload = db.get(FileUpload, job_id)
+        if file_upload:
             file_upload.status = "error"
             file_upload.error_message = str(e)
             db.commit()
+            response_cache.invalidate()
+        job.fail(str(e))
+    finally:
+        db.close()
+        upload.cleanup()
+
+def process_upload_in_worker(upload: StoredUpload, filename: str, user_ip: str, delta: bool = False) -> Dict[str, Any]:
+    """在工作執行緒中以獨立的資料庫連線處理上傳檔案，完成後刪除暫存檔"""
+    db = SessionLocal()
+    try:
+        return process_excel_file(upload, filename, db, user_ip, delta=delta)
+    finally:
+        db.close()
+        upload.cleanup()
+
+def cleanup_batch(entries: List[BatchEntry]) -> None:
+    for entry in entries:
+        if entry.upload:
+            entry.upload.cleanup()
+
+def commit_batch_group(db: Session, group: List[Tuple[int, str, UploadJob, Dict[str, Any]]],
+                       results: List[Optional[Dict[str, Any]]]) -> None:
+    """提交一組批次上傳的檔案；提交失敗時整組記為錯誤"""
+    try:
+        with upload_stage_seconds.time(stage="commit"):
+            db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"批次上傳提交時發生錯誤: {str(e)}")
+        for position, file_hash, job, result in group:
+            job.fail(str(e))
+            results[position] = {"filename": result["filename"], "status": "error", "detail": f"提交時發生錯誤: {str(e)}"}
+        return
+    response_cache.invalidate()
+    for position, file_hash, job, result in group:
+        recent_file_hashes.set(file_hash, result["file_id"])
+        job.complete(result)
+        results[position] = result
+
+def ingest_batch(entries: List[BatchEntry], db: Session, user_ip: str, delta: bool = False) -> Dict[str, Any]:
+    """依序寫入批次上傳的檔案，回傳各檔案的結果（依上傳順序）
+    
+    內容相同的檔案（批次內或已上傳過）只處理一次。每個工作簿與單檔上傳相同，以open_workbook
+    串流讀取（同一時間只有一個工作簿的一段資料在記憶體中）；每BATCH_COMMIT_FILES個檔案
+    （或累計BATCH_COMMIT_CELLS個儲存格）提交一次，單一檔案失敗時只回滾該檔案。
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(entries)
+    first_seen: Dict[str, int] = {}
+    pending: List[int] = []
+    for position, entry in enumerate(entries):
+        if entry.upload is None:
+            results[position] = {"filename": entry.filename, "status": "error", "detail": entry.error}
+        elif entry.upload.file_hash not in first_seen:
+            first_seen[entry.upload.file_hash] = position
+            pending.append(position)
+    
+    existing = find_duplicates(db, first_seen)
+    for position in list(pending):
+        file_id = existing.get(entries[position].upload.file_hash)
+        if file_id is not None:
+            results[position] = {
+                "filename": entries[position].filename,
+                "status": "duplicate",
+                "message": "檔案已經上傳過",
+                "file_id": file_id
+            }
+            pending.remove(position)
+    
+    group: List[Tuple[int, str, UploadJob, Dict[str, Any]]] = []
+    group_cells = 0
+    commits = 0
+    for position in pending:
+        entry = entries[position]
+        job = None
+        try:
+            with open_workbook(entry.upload) as excel_file, db.begin_nested():
+                file_upload = FileUpload(
+                    filename=sanitize_filename(entry.filename),
+                    file_size=entry.upload.size,
+                    file_hash=entry.upload.file_hash,
+                    status="processing",
+                    user_ip=user_ip
+                )
+                db.add(file_upload)
+                db.flush()
+                job = upload_jobs.create(file_upload.id, file_upload.filename, status="processing")
+                result = ingest_workbook(excel_file, file_upload, db, job, commit=False, delta=delta)
+        except Exception as e:
+            logger.error(f"批次處理檔案 {entry.filename} 時發生錯誤: {str(e)}")
+            if job:
+                upload_jobs.discard(job.job_id)
+            results[position] = {"filename": entry.filename, "status": "error", "detail": f"處理檔案時發生錯誤: {str(e)}"}
+            continue
         
-        raise HTTPException(
-            status_code=400,
-            detail=f"處理檔案時發生錯誤: {str(e)}"
+        group.append((position, entry.upload.file_hash, job, {"filename": entry.filename, **result}))
+        group_cells += result["total_rows"]
+        if len(group) >= BATCH_COMMIT_FILES or group_cells >= BATCH_COMMIT_CELLS:
+            commit_batch_group(db, group, results)
+            commits += 1
+            group, group_cells = [], 0
+    if group:
+        commit_batch_group(db, group, results)
+        commits += 1
+    
+    # 批次內重複的檔案沿用第一次出現者的結果
+    for position, entry in enumerate(entries):
+        if results[position] is None:
+            first = results[first_seen[entry.upload.file_hash]]
+            results[position] = {
+                "filename": entry.filename,
+                "status": "duplicate",
+                "message": f"與批次內的 {first['filename']} 內容相同",
+                "file_id": first.get("file_id")
+            }
+    
+    statuses = [result["status"] for result in results]
+    return {
+        "status": "completed",
+        "files": len(entries),
+        "succeeded": statuses.count("success"),
+        "duplicates": statuses.count("duplicate"),
+        "failed": statuses.count("error"),
+        "total_rows": sum(result.get("total_rows", 0) for result in results if result["status"] == "success"),
+        "commits": commits,
+        "results": results
+    }
+
+def process_batch_in_worker(entries: List[BatchEntry], user_ip: str, delta: bool = False) -> Dict[str, Any]:
+    """在工作執行緒中以獨立的資料庫連線處理批次上傳，完成後刪除所有暫存檔"""
+    db = SessionLocal()
+    try:
+        return ingest_batch(entries, db, user_ip, delta)
+    finally:
+        db.close()
+        cleanup_batch(entries)
+
+def match_filter(column, value: str, match: str):
+    """名稱比對條件：exact與prefix可走索引，contains為子字串比對
+    
+    prefix以LIKE 'abc%'表示（PostgreSQL使用text_pattern_ops索引，不受資料庫定序影響）；
+    SQLite的LIKE不分大小寫，另以substr比對前綴，各資料庫的結果都區分大小寫。
+    """
+    if match == "exact":
+        return column == value
+    if match == "prefix":
+        return and_(column.startswith(value, autoescape=True), func.substr(column, 1, len(value)) == value)
+    return column.contains(value, autoescape=True)
+
+def matching_ids(db: Session, model, value: str, match: str) -> List[int]:
+    """在維度表中找出名稱符合的ID"""
+    return [row[0] for row in db.query(model.id).filter(match_filter(model.name, value, match))]
+
+def encode_cursor(**values: Any) -> str:
+    """將分頁位置編碼為不透明的游標字串"""
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, **types: type) -> Dict[str, Any]:
+    """解碼游標字串並檢查各鍵的型別（例如 id=int），格式不符時回傳400"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, dict) or set(values) != set(types):
+            raise ValueError(cursor)
+        for key, value_type in types.items():
+            # bool是int的子類別，需以type比對；整數限制在資料庫的64位元範圍內
+            if type(values[key]) is not value_type or (value_type is int and not -2**63 <= values[key] < 2**63):
+                raise ValueError(cursor)
+        return values
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="無效的分頁游標")
+
+def set_next_cursor(request: Request, response: Response, cursor: Optional[str]) -> None:
+    """在回應標頭提供下一頁游標（X-Next-Cursor與Link），最後一頁則不設定"""
+    if cursor is None:
+        return
+    response.headers["X-Next-Cursor"] = cursor
+    next_url = request.url.remove_query_params("offset").include_query_params(cursor=cursor)
+    response.headers["Link"] = f'<{next_url}>; rel="next"'
+
+def cached_json(request: Request, cached: CachedResponse) -> Response:
+    """輸出快取的回應（If-None-Match相符時為304），並補上下一頁的Link標頭"""
+    response = cached.to_response(request)
+    set_next_cursor(request, response, cached.headers.get("X-Next-Cursor"))
+    return response
+
+def select_cells():
+    """儲存格查詢：聯結維度表，欄位名稱與舊版excel_data相同"""
+    return (
+        select(
+            ExcelData.id,
+            FileUpload.filename,
+            SheetName.name.label("sheet_name"),
+            ExcelData.row_number,
+            ColumnName.name.label("column_name"),
+            ExcelData.cell_value,
+            DataType.name.label("data_type"),
+            FileUpload.upload_time
         )
+        .join(FileUpload, ExcelData.file_id == FileUpload.id)
+        .join(SheetName, ExcelData.sheet_id == SheetName.id)
+        .join(ColumnName, ExcelData.column_id == ColumnName.id)
+        .join(DataType, ExcelData.type_id == DataType.id)
+    )
 
 # API端點
 @app.get("/")
@@ -344,37 +1389,93 @@ async def root():
         "security": "enhanced",
         "endpoints": {
             "upload": "/upload/",
+            "upload_batch": "/upload/batch/",
             "data": "/data/",
             "files": "/files/",
+            "jobs": "/jobs/{job_id}",
             "health": "/health/"
         }
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(token: str = Depends(verify_token)):
+    """Prometheus格式的效能指標：上傳各階段耗時、寫入吞吐量、速率限制判斷與各端點延遲"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/health/")
 async def health_check():
     return {
         "status": "healthy", 
         "timestamp": datetime.utcnow(),
-        "security": "enabled"
+        "security": "enabled",
+        "response_cache": await run_in_threadpool(response_cache.stats)
     }
 
-@app.post("/upload/", response_model=Dict[str, Any])
+def multipart_upload_body(field: str, multiple: bool) -> Dict[str, Any]:
+    """上傳端點自行串流解析請求內容，不宣告File參數，改在OpenAPI中描述multipart內容"""
+    file_schema = {"type": "string", "format": "binary"}
+    schema = {"type": "array", "items": file_schema} if multiple else file_schema
+    return {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+        "type": "object", "properties": {field: schema}, "required": [field]
+    }}}}}
+
+def upload_validation_error(filename: str, allowed_extensions: List[str]) -> Optional[str]:
+    """檔案檢查失敗時回傳錯誤訊息（供串流接收時逐檔判斷）"""
+    try:
+        validate_file(filename, allowed_extensions)
+    except HTTPException as e:
+        return e.detail
+    return None
+
+@app.post("/upload/", response_model=Dict[str, Any], openapi_extra=multipart_upload_body("file", multiple=False))
 async def upload_excel_file(
     request: Request,
-    file: UploadFile = File(...),
+    response: Response,
+    mode: str = "sync",
+    ingest: str = "full",
     db: Session = Depends(get_db),
     token: str = Depends(verify_token),
-    session: UserSession = Depends(check_rate_limit)
+    session: RateLimitDecision = Depends(check_rate_limit)
 ):
-    """上傳Excel檔案並處理資料（安全版）"""
+    """上傳Excel檔案並處理資料（安全版）
     
-    # 檔案安全檢查
-    validate_file(file)
+    mode=async 時，檔案登記後立即回傳202與工作ID，由背景工作處理資料，
+    可透過 GET /jobs/{job_id} 查詢進度。
+    ingest=delta 時只寫入與同檔名上一版相比新增或變更的列。
+    """
     
-    # 讀取檔案內容
-    content = await file.read()
+    if mode not in ("sync", "async"):
+        raise HTTPException(status_code=400, detail="mode 只支援 sync 或 async")
+    delta = is_delta_ingest(ingest)
     
-    if len(content) == 0:
+    # 串流接收請求內容：檔案安全檢查通過後邊讀邊檢查大小、計算雜湊值並寫入暫存檔
+    try:
+        entries = await receive_uploads(
+            request, "file",
+            max_file_size=MAX_FILE_SIZE,
+            max_total=MAX_FILE_SIZE + UPLOAD_MULTIPART_OVERHEAD,
+            max_files=1,
+            chunk_size=UPLOAD_CHUNK_SIZE,
+            directory=UPLOAD_TMP_DIR,
+            validate=lambda filename: upload_validation_error(filename, EXCEL_EXTENSIONS),
+            oversize_error=file_too_large_error().detail
+        )
+    except (UploadTooLargeError, TooManyFilesError) as e:
+        raise file_too_large_error() if isinstance(e, UploadTooLargeError) else \
+            HTTPException(status_code=400, detail="一次只能上傳一個檔案")
+    except InvalidUploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not entries:
+        raise HTTPException(status_code=400, detail="請提供 file 欄位的檔案")
+    file = entries[0]
+    if file.error:
+        status_code = 413 if file.error == file_too_large_error().detail else 400
+        raise HTTPException(status_code=status_code, detail=file.error)
+    upload = file.upload
+    
+    if upload.size == 0:
+        upload.cleanup()
         raise HTTPException(
             status_code=400,
             detail="檔案為空"
@@ -383,61 +1484,419 @@ async def upload_excel_file(
     # 取得用戶IP
     user_ip = request.client.host
     
-    # 處理檔案
-    result = process_excel_file(content, file.filename, db, user_ip)
+    # 重複檔案直接回傳，不解析工作簿也不佔用工作池（資料庫查詢在執行緒中進行）
+    duplicate = await run_in_threadpool(find_duplicate, db, upload.file_hash)
+    if duplicate:
+        upload.cleanup()
+        return duplicate
+    
+    if mode == "async":
+        return await enqueue_upload_job(upload, file.filename, user_ip, response, delta)
+    
+    # 處理檔案（交由工作池執行，佇列已滿時回傳503；暫存檔由工作執行緒刪除）
+    try:
+        result = await upload_pool.run(process_upload_in_worker, upload, file.filename, user_ip, delta)
+    except PoolSaturatedError:
+        upload.cleanup()
+        raise pool_saturated_error()
     
     return result
 
-@app.get("/data/", response_model=List[ExcelDataResponse])
-async def get_data(
+@app.post("/upload/batch/", response_model=Dict[str, Any], openapi_extra=multipart_upload_body("files", multiple=True))
+async def upload_excel_batch(
+    request: Request,
+    ingest: str = "full",
+    token: str = Depends(verify_token),
+    session: RateLimitDecision = Depends(check_rate_limit)
+):
+    """一次上傳多個Excel檔案（或內含Excel檔案的zip壓縮檔）
+    
+    整批只驗證與計算一次速率限制，在同一個工作中以少數幾次提交寫入，
+    回傳各檔案的結果（success、duplicate 或 error）。ingest=delta 同 /upload/。
+    """
+    delta = is_delta_ingest(ingest)
+    entries = await receive_batch(request)
+    if not entries:
+        raise HTTPException(status_code=400, detail="批次中沒有任何檔案")
+    
+    try:
+        return await upload_pool.run(process_batch_in_worker, entries, request.client.host, delta)
+    except PoolSaturatedError:
+        cleanup_batch(entries)
+        raise pool_saturated_error()
+
+async def receive_batch(request: Request) -> List[BatchEntry]:
+    """串流接收批次上傳的檔案並寫入暫存檔（zip接收完成後解壓縮為個別檔案）
+    
+    檔名、格式或大小不符的檔案記為該檔的錯誤；檔案數或總大小超過上限時整批拒絕。
+    """
+    try:
+        received = await receive_uploads(
+            request, "files",
+            max_file_size=MAX_FILE_SIZE,
+            max_total=MAX_BATCH_SIZE + UPLOAD_MULTIPART_OVERHEAD + MAX_BATCH_FILES * 1024,  # 每個檔案各有表頭
+            max_files=MAX_BATCH_FILES,
+            chunk_size=UPLOAD_CHUNK_SIZE,
+            directory=UPLOAD_TMP_DIR,
+            validate=lambda filename: upload_validation_error(filename, BATCH_EXTENSIONS),
+            unlimited_suffixes=(".zip",),
+            oversize_error=file_too_large_error().detail
+        )
+    except TooManyFilesError:
+        raise HTTPException(status_code=400, detail=f"單次最多上傳 {MAX_BATCH_FILES} 個檔案")
+    except UploadTooLargeError:
+        raise batch_too_large_error()
+    except InvalidUploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    entries: List[BatchEntry] = []
+    archives: List[BatchEntry] = []
+    for entry in received:
+        if entry.upload and Path(entry.filename).suffix.lower() == ".zip":
+            archives.append(entry)
+        elif entry.upload and entry.upload.size == 0:
+            entry.upload.cleanup()
+            entries.append(BatchEntry(entry.filename, error="檔案為空"))
+        else:
+            entries.append(entry)
+    total = sum(entry.upload.size for entry in entries if entry.upload)
+    
+    try:
+        if total > MAX_BATCH_SIZE:
+            raise UploadTooLargeError()
+        for archive in archives:
+            try:
+                members = await run_in_threadpool(
+                    extract_archive, archive.upload.path, EXCEL_EXTENSIONS, MAX_BATCH_FILES - len(entries),
+                    MAX_FILE_SIZE, MAX_BATCH_SIZE - total, UPLOAD_CHUNK_SIZE, UPLOAD_TMP_DIR
+                )
+            except zipfile.BadZipFile:
+                entries.append(BatchEntry(archive.filename, error="無效的zip壓縮檔"))
+                continue
+            finally:
+                archive.upload.cleanup()
+            entries.extend(members)
+            total += sum(entry.upload.size for entry in members if entry.upload)
+            
+            if len(entries) > MAX_BATCH_FILES:
+                raise TooManyFilesError()
+    except TooManyFilesError:
+        cleanup_batch(entries + archives)
+        raise HTTPException(status_code=400, detail=f"單次最多上傳 {MAX_BATCH_FILES} 個檔案")
+    except UploadTooLargeError:
+        cleanup_batch(entries + archives)
+        raise batch_too_large_error()
+    except BaseException:
+        cleanup_batch(entries + archives)
+        raise
+    return entries
+
+def is_delta_ingest(ingest: str) -> bool:
+    """檢查ingest參數（full或delta）；增量寫入只支援eav儲存模式"""
+    if ingest not in ("full", "delta"):
+        raise HTTPException(status_code=400, detail="ingest 只支援 full 或 delta")
+    if ingest == "delta" and STORAGE_MODE != "eav":
+        raise HTTPException(status_code=400, detail="增量寫入只支援 STORAGE_MODE=eav")
+    return ingest == "delta"
+
+def pool_saturated_error() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="伺服器忙碌中，請稍後再試",
+        headers={"Retry-After": str(UPLOAD_RETRY_AFTER)}
+    )
+
+def register_upload(upload: StoredUpload, filename: str, user_ip: str) -> int:
+    """以獨立的資料庫連線登記排隊中（queued）的上傳，回傳FileUpload.id
+    
+    SQLite上需等待進行中的寫入釋放寫入鎖，須在執行緒中呼叫，不可阻塞事件迴圈。
+    """
+    db = SessionLocal()
+    try:
+        file_upload = FileUpload(
+            filename=filename,
+            file_size=upload.size,
+            file_hash=upload.file_hash,
+            status="queued",
+            user_ip=user_ip
+        )
+        db.add(file_upload)
+        db.flush()
+        file_id = file_upload.id
+        db.commit()
+        return file_id
+    finally:
+        db.close()
+
+def unregister_upload(file_id: int) -> None:
+    """刪除未能排入背景處理的上傳登記（同樣在執行緒中呼叫）"""
+    db = SessionLocal()
+    try:
+        db.query(FileUpload).filter(FileUpload.id == file_id).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+async def enqueue_upload_job(upload: StoredUpload, filename: str, user_ip: str,
+                             response: Response, delta: bool = False) -> Dict[str, Any]:
+    """登記上傳檔案並排入背景處理，回傳202與工作ID（暫存檔由背景工作刪除）"""
+    file_hash = upload.file_hash
+    safe_filename = sanitize_filename(filename)
+    file_id = await run_in_threadpool(register_upload, upload, safe_filename, user_ip)
+    await response_cache.ainvalidate()
+    
+    recent_file_hashes.set(file_hash, file_id)
+    job = upload_jobs.create(file_id, safe_filename)
+    try:
+        upload_pool.submit(run_upload_job, file_id, upload, delta)
+    except PoolSaturatedError:
+        upload.cleanup()
+        upload_jobs.discard(job.job_id)
+        recent_file_hashes.discard(file_hash)
+        await run_in_threadpool(unregister_upload, file_id)
+        await response_cache.ainvalidate()
+        raise pool_saturated_error()
+    
+    response.status_code = status.HTTP_202_ACCEPTED
+    response.headers["Location"] = f"/jobs/{file_id}"
+    return {
+        "status": "queued",
+        "message": "檔案已接收，正在背景處理",
+        "job_id": file_id,
+        "file_id": file_id,
+        "file_hash": file_hash,
+        "status_url": f"/jobs/{file_id}"
+    }
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+def get_job_status(
+    job_id: int,
     request: Request,
-    query: DataQuery = Depends(),
     db: Session = Depends(get_db),
     token: str = Depends(verify_token),
-    session: UserSession = Depends(check_rate_limit)
+    session: RateLimitDecision = Depends(check_rate_limit)
 ):
-    """查詢Excel資料（安全版）"""
+    """查詢上傳處理工作的進度"""
     
-    query_obj = db.query(ExcelData)
+    job = upload_jobs.get(job_id)
+    if job:
+        return job.snapshot()
+    
+    # 不在記憶體中（例如伺服器重啟後），改由資料庫狀態回報
+    file_upload = db.query(FileUpload).filter(FileUpload.id == job_id).first()
+    if not file_upload:
+        raise HTTPException(status_code=404, detail="工作不存在")
+    
+    cells_written = db.query(ExcelData).filter(ExcelData.file_id == file_upload.id).count()
+    return {
+        "job_id": file_upload.id,
+        "filename": file_upload.filename,
+        "status": file_upload.status,
+        "cells_written": cells_written,
+        "error": file_upload.error_message,
+        "created_at": file_upload.upload_time
+    }
+
+def utc_naive(value: datetime) -> datetime:
+    """含時區的時間轉為UTC並去除時區，與value_time的儲存方式一致"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def data_statement(db: Session, query: DataQuery):
+    """建立 /data/ 的查詢（多取一筆以判斷是否還有下一頁）；任一名稱條件沒有符合者時回傳None"""
+    query_obj = select_cells().add_columns(ExcelData.value_num, ExcelData.value_time)
+    
+    # 應用篩選條件（先解析為ID，任一條件沒有符合者即可直接回傳）
+    if query.filename or query.file_hash:
+        files = db.query(FileUpload.id)
+        if query.file_hash:
+            files = files.filter(FileUpload.file_hash == query.file_hash)
+        if query.filename:
+            files = files.filter(match_filter(FileUpload.filename, query.filename, query.match))
+        file_ids = [row[0] for row in files]
+        if not file_ids:
+            return None
+        if query.file_hash:
+            # 增量上傳的版本只保有變更的列，依雜湊值查詢時取整條版本鏈
+            file_ids = lineage_file_ids(db, file_ids)
+        query_obj = query_obj.filter(ExcelData.file_id.in_(file_ids))
+    
+    for value, model, column in (
+        (query.sheet_name, SheetName, ExcelData.sheet_id),
+        (query.column_name, ColumnName, ExcelData.column_id),
+    ):
+        if value:
+            ids = matching_ids(db, model, value, query.match)
+            if not ids:
+                return None
+            query_obj = query_obj.filter(column.in_(ids))
     
-    # 應用篩選條件
-    if query.filename:
-        query_obj = query_obj.filter(ExcelData.filename.contains(query.filename))
-    if query.sheet_name:
-        query_obj = query_obj.filter(ExcelData.sheet_name.contains(query.sheet_name))
-    if query.column_name:
-        query_obj = query_obj.filter(ExcelData.column_name.contains(query.column_name))
     if query.data_type:
-        query_obj = query_obj.filter(ExcelData.data_type == query.data_type)
+        ids = matching_ids(db, DataType, query.data_type, "exact")
+        if not ids:
+            return None
+        query_obj = query_obj.filter(ExcelData.type_id.in_(ids))
+    
+    # 範圍條件直接作用於具型別的欄位（非數值/時間的儲存格為NULL，自然不符合）
+    for value, condition in (
+        (query.value_min, lambda value: ExcelData.value_num >= value),
+        (query.value_max, lambda value: ExcelData.value_num <= value),
+        (query.time_from, lambda value: ExcelData.value_time >= utc_naive(value)),
+        (query.time_to, lambda value: ExcelData.value_time <= utc_naive(value)),
+    ):
+        if value is not None:
+            query_obj = query_obj.filter(condition(value))
     
     # 分頁
-    data = query_obj.offset(query.offset).limit(query.limit).all()
+    query_obj = query_obj.order_by(ExcelData.id)
+    if query.cursor:
+        position = decode_cursor(query.cursor, id=int)
+        query_obj = query_obj.filter(ExcelData.id > position["id"])
+    else:
+        query_obj = query_obj.offset(query.offset)
+    return query_obj.limit(query.limit + 1)
+
+def data_page(db: Session, query: DataQuery) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+    """執行 /data/ 查詢，回傳（資料列, 回應標頭）"""
+    statement = data_statement(db, query)
+    if statement is None:
+        return [], {}
+    data = db.execute(statement).all()
     
-    return data
+    headers = {}
+    if len(data) > query.limit:
+        data = data[:query.limit]
+        headers["X-Next-Cursor"] = encode_cursor(id=data[-1].id)
+    
+    return [ExcelDataResponse.model_validate(row).model_dump() for row in data], headers
 
-@app.get("/data/stats/")
-async def get_data_stats(
+@app.get("/data/", response_model=List[ExcelDataResponse])
+async def get_data(
+    request: Request,
+    query: DataQuery = Depends(),
+    db: AsyncSession = Depends(get_async_db),
+    token: str = Depends(verify_token),
+    session: RateLimitDecision = Depends(check_rate_limit)
+):
+    """查詢Excel資料（安全版）
+    
+    名稱篩選預設為前綴比對（match=prefix），exact為完全相符，兩者皆先在小型的
+    檔案與維度表上解析出ID，再以複合索引查詢儲存格；match=contains 為子字串比對。
+    
+    value_min/value_max 與 time_from/time_to 篩選數值與時間儲存格（value_num、value_time），
+    搭配 column_name 時走 (column_id, value) 索引的範圍掃描。
+    
+    分頁建議使用cursor：以id為鍵接續查詢，任何深度的頁面成本都與第一頁相同；
+    下一頁游標放在回應標頭X-Next-Cursor（最後一頁沒有此標頭）。
+    """
+    
+    if query.match not in MATCH_MODES:
+        raise HTTPException(status_code=400, detail=f"match 只支援: {', '.join(MATCH_MODES)}")
+    
+    cached = await response_cache.aget_or_build(cache_key("data", **query.model_dump()), lambda: db.run_sync(data_page, query))
+    return cached_json(request, cached)
+
+def read_sheet_frame(db: Session, file_ids: List[int], sheet_name: str, columns: Optional[List[str]],
+                     row_from: Optional[int], row_to: Optional[int]) -> Optional[pd.DataFrame]:
+    """讀取工作表為表格：有寬表時直接讀取，否則以一次索引查詢取出儲存格再轉置；工作表不存在時回傳None
+    
+    file_ids 為同一版本鏈的所有版本（見 lineage_file_ids），每一列的儲存格只存在於其中一個版本。
+    """
+    sheet_table = db.query(SheetTable).filter(
+        SheetTable.file_id.in_(file_ids),
+        SheetTable.sheet_name == sheet_name
+    ).first()
+    if sheet_table:
+        return read_wide_frame(db, sheet_table.table_name, json.loads(sheet_table.columns), columns, row_from, row_to)
+    
+    sheet_ids = matching_ids(db, SheetName, sheet_name, "exact")
+    if not sheet_ids:
+        return None
+    
+    # 條件依 ix_excel_cells_file_sheet_column_row 的欄位順序
+    cells = db.query(
+        ExcelData.id, ExcelData.row_number, ExcelData.column_id, ExcelData.cell_value, ExcelData.type_id
+    ).filter(ExcelData.file_id.in_(file_ids), ExcelData.sheet_id == sheet_ids[0])
+    if columns:
+        column_ids = [row[0] for row in db.query(ColumnName.id).filter(ColumnName.name.in_(columns))]
+        cells = cells.filter(ExcelData.column_id.in_(column_ids))
+    if row_from is not None:
+        cells = cells.filter(ExcelData.row_number >= row_from)
+    if row_to is not None:
+        cells = cells.filter(ExcelData.row_number <= row_to)
+    
+    frame = pd.DataFrame(cells.all(), columns=["id", "row_number", "column_id", "cell_value", "type_id"])
+    if frame.empty and not db.query(ExcelData.id).filter(
+        ExcelData.file_id.in_(file_ids), ExcelData.sheet_id == sheet_ids[0]
+    ).first():
+        return None
+    return pivot_cells(
+        frame,
+        column_names.name_of(db, frame["column_id"].unique().tolist()),
+        data_types.name_of(db, frame["type_id"].unique().tolist())
+    )
+
+@app.get("/data/sheet/")
+def get_sheet_table(
     request: Request,
+    file_hash: str,
+    sheet_name: str,
+    columns: Optional[List[str]] = Query(None),
+    row_from: Optional[int] = None,
+    row_to: Optional[int] = None,
+    format: str = "json",
     db: Session = Depends(get_db),
     token: str = Depends(verify_token),
-    session: UserSession = Depends(check_rate_limit)
+    session: RateLimitDecision = Depends(check_rate_limit)
 ):
-    """取得資料統計資訊（安全版）"""
+    """以表格形式取回整個工作表（可選擇欄位與列範圍）
     
-    total_records = db.query(ExcelData).count()
+    一次請求即取得已轉置的表格，不需逐頁讀取 /data/ 再於用戶端轉置。
+    format 支援 json、csv 與 arrow（Arrow IPC串流，需要pyarrow）。
+    """
+    
+    if format not in ("json", "csv", "arrow"):
+        raise HTTPException(status_code=400, detail="format 只支援 json、csv 或 arrow")
+    if format == "arrow":
+        try:
+            require_pyarrow()
+        except RuntimeError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    file_upload = db.query(FileUpload).filter(FileUpload.file_hash == file_hash).first()
+    if not file_upload:
+        raise HTTPException(status_code=404, detail="檔案不存在")
+    
+    df = read_sheet_frame(db, lineage_file_ids(db, [file_upload.id]), sheet_name, columns, row_from, row_to)
+    if df is None:
+        raise HTTPException(status_code=404, detail="工作表不存在")
+    
+    if format == "json":
+        return {"sheet_name": sheet_name, "columns": list(df.columns), "rows": frame_rows(df)}
+    
+    media_type, extension = EXPORT_FORMATS[format]
+    return Response(
+        content=encode_frame(df, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="sheet.{extension}"'}
+    )
+
+def data_stats(db: Session) -> Dict[str, Any]:
+    total_records = db.query(func.coalesce(func.sum(SheetStat.cell_count), 0)).scalar()
     total_files = db.query(FileUpload).count()
     
     # 按檔案分組統計
     file_stats = db.query(
-        ExcelData.filename,
-        db.func.count(ExcelData.id).label('record_count')
-    ).group_by(ExcelData.filename).all()
+        FileUpload.filename,
+        func.sum(SheetStat.cell_count).label('record_count')
+    ).join(FileUpload, SheetStat.file_id == FileUpload.id).group_by(FileUpload.filename).all()
     
     # 按工作表分組統計
     sheet_stats = db.query(
-        ExcelData.sheet_name,
-        db.func.count(ExcelData.id).label('record_count')
-    ).group_by(ExcelData.sheet_name).all()
+        SheetName.name,
+        func.sum(SheetStat.cell_count).label('record_count')
+    ).join(SheetName, SheetStat.sheet_id == SheetName.id).group_by(SheetName.name).all()
     
     return {
         "total_records": total_records,
@@ -450,17 +1909,193 @@ async def get_data_stats(
         }
     }
 
+@app.get("/data/stats/")
+async def get_data_stats(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    token: str = Depends(verify_token),
+    session: RateLimitDecision = Depends(check_rate_limit)
+):
+    """取得資料統計資訊（安全版）
+    
+    數字來自寫入與刪除時維護的sheet_stats（每個檔案每個工作表一筆），
+    不掃描excel_cells；可用 POST /admin/stats/recompute/ 重新計算。
+    """
+    
+    async def build():
+        return await db.run_sync(data_stats), {}
+    
+    cached = await response_cache.aget_or_build(cache_key("stats"), build)
+    return cached_json(request, cached)
+
+@app.get("/admin/profiles/")
+async def list_profiles(token: str = Depends(verify_admin_token)):
+    """最近的剖析結果（不含剖析內容）"""
+    return [
+        {key: value for key, value in record.items() if key != "profile"}
+        for record in request_profiler.profiles.list()
+    ]
+
+@app.get("/admin/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: int, token: str = Depends(verify_admin_token)):
+    """剖析內容：cprofile為依累計時間排序的pstats報表，sample為collapsed stack格式"""
+    record = request_profiler.profiles.get(profile_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="剖析結果不存在或已被清除")
+    return PlainTextResponse(record["profile"])
+
+@app.get("/admin/slow-requests/")
+async def list_slow_requests(token: str = Depends(verify_admin_token)):
+    """超過SLOW_REQUEST_SECONDS的最近請求與其執行的SQL"""
+    return request_profiler.slow_requests.list()
+
+@app.post("/admin/stats/recompute/")
+def recompute_stats(
+    request: Request,
+    db: Session = Depends(get_db),
+    token: str = Depends(verify_admin_token),
+    session: RateLimitDecision = Depends(check_rate_limit)
+):
+    """由excel_cells重新計算統計資料（管理功能）"""
+    
+    recompute_sheet_stats(db)
+    db.commit()
+    response_cache.invalidate()
+    
+    total_records = db.query(func.coalesce(func.sum(SheetStat.cell_count), 0)).scalar()
+    return {
+        "message": "統計資料已重新計算",
+        "sheets": db.query(SheetStat).count(),
+        "total_records": total_records
+    }
+
+def files_page(db: Session, limit: Optional[int], cursor: Optional[str]) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+    """執行 /files/ 查詢，回傳（檔案列, 回應標頭）"""
+    files = db.query(FileUpload).order_by(FileUpload.upload_time.desc(), FileUpload.id.desc())
+    headers = {}
+    if limit is None and cursor is None:
+        page = files.all()
+    else:
+        limit = limit or 100
+        if cursor:
+            position = decode_cursor(cursor, upload_time=str, id=int)
+            try:
+                upload_time = datetime.fromisoformat(position["upload_time"])
+            except ValueError:
+                raise HTTPException(status_code=400, detail="無效的分頁游標")
+            files = files.filter(
+                (FileUpload.upload_time < upload_time)
+                | and_(FileUpload.upload_time == upload_time, FileUpload.id < position["id"])
+            )
+        
+        page = files.limit(limit + 1).all()
+        if len(page) > limit:
+            page = page[:limit]
+            last = page[-1]
+            headers["X-Next-Cursor"] = encode_cursor(upload_time=last.upload_time.isoformat(), id=last.id)
+    
+    return [FileUploadResponse.model_validate(f).model_dump() for f in page], headers
+
 @app.get("/files/", response_model=List[FileUploadResponse])
 async def get_uploaded_files(
     request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    token: str = Depends(verify_token),
+    session: RateLimitDecision = Depends(check_rate_limit)
+):
+    """取得已上傳的檔案列表（安全版）
+    
+    未指定limit與cursor時回傳全部檔案；指定後依(upload_time, id)游標分頁，
+    下一頁游標放在回應標頭X-Next-Cursor。
+    """
+    
+    cached = await response_cache.aget_or_build(
+        cache_key("files", limit=limit, cursor=cursor),
+        lambda: db.run_sync(files_page, limit, cursor)
+    )
+    return cached_json(request, cached)
+
+@app.get("/files/{file_id}/sheets/", response_model=List[SheetTableResponse])
+def get_file_sheets(
+    file_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    token: str = Depends(verify_token),
+    session: RateLimitDecision = Depends(check_rate_limit)
+):
+    """列出檔案以寬表儲存的工作表"""
+    
+    sheet_tables = db.query(SheetTable).filter(SheetTable.file_id == file_id).order_by(SheetTable.id).all()
+    return [
+        {
+            "sheet_name": t.sheet_name,
+            "row_count": t.row_count,
+            "columns": [{"name": c["name"], "type": c["type"]} for c in json.loads(t.columns)]
+        }
+        for t in sheet_tables
+    ]
+
+@app.get("/files/{file_id}/sheets/{sheet_name}/")
+def get_file_sheet(
+    file_id: int,
+    sheet_name: str,
+    request: Request,
+    columns: Optional[List[str]] = Query(None),
+    row_from: Optional[int] = None,
+    row_to: Optional[int] = None,
+    layout: str = "wide",
     db: Session = Depends(get_db),
     token: str = Depends(verify_token),
-    session: UserSession = Depends(check_rate_limit)
+    session: RateLimitDecision = Depends(check_rate_limit)
 ):
-    """取得已上傳的檔案列表（安全版）"""
+    """讀取以寬表儲存的工作表（layout=wide 整列輸出，layout=eav 每格一筆以相容舊格式）"""
+    
+    if layout not in ("wide", "eav"):
+        raise HTTPException(status_code=400, detail="layout 只支援 wide 或 eav")
+    
+    sheet_table = db.query(SheetTable).filter(
+        SheetTable.file_id == file_id,
+        SheetTable.sheet_name == sheet_name
+    ).first()
+    if not sheet_table:
+        raise HTTPException(status_code=404, detail="工作表不存在或未以寬表儲存")
+    
+    df = read_wide_frame(db, sheet_table.table_name, json.loads(sheet_table.columns), columns, row_from, row_to)
+    
+    if layout == "eav":
+        # 以列號為索引展開，row_number即為Excel列號
+        df.index = df.index - 1
+        cells = frame_to_cells(df)
+        return [
+            {"sheet_name": sheet_name, "row_number": r, "column_name": c, "cell_value": v, "data_type": t}
+            for r, c, v, t in zip(*(cells[k].tolist() for k in ("row_number", "column_name", "cell_value", "data_type")))
+        ]
     
-    files = db.query(FileUpload).order_by(FileUpload.upload_time.desc()).all()
-    return files
+    return {"sheet_name": sheet_name, "columns": list(df.columns), "rows": frame_rows(df)}
+
+def check_deletable(db: Session, file_ids: List[int]) -> None:
+    """處理中的檔案仍在寫入儲存格，不能刪除"""
+    busy = [row[0] for row in db.query(FileUpload.id).filter(
+        FileUpload.id.in_(file_ids),
+        FileUpload.status.in_(("queued", "processing"))
+    )]
+    if busy:
+        raise HTTPException(status_code=409, detail=f"檔案處理中，無法刪除: {busy}")
+
+def check_file_deletable(db: Session, file_id: int) -> None:
+    """單一檔案刪除前的檢查：不存在回傳404，處理中回傳409"""
+    if not db.query(FileUpload.id).filter(FileUpload.id == file_id).first():
+        raise HTTPException(status_code=404, detail="檔案不存在")
+    check_deletable(db, [file_id])
+
+def deletion_cells(db: Session, file_ids: List[int]) -> int:
+    """批次刪除前的檢查，回傳要刪除的儲存格總數（依sheet_stats）"""
+    check_deletable(db, file_ids)
+    return db.query(func.coalesce(func.sum(SheetStat.cell_count), 0)).filter(
+        SheetStat.file_id.in_(file_ids)
+    ).scalar()
 
 @app.delete("/files/{file_id}/")
 async def delete_file(
@@ -468,24 +2103,104 @@ async def delete_file(
     request: Request,
     db: Session = Depends(get_db),
     token: str = Depends(verify_token),
-    session: UserSession = Depends(check_rate_limit)
+    session: RateLimitDecision = Depends(check_rate_limit)
 ):
     """刪除檔案及其相關資料（安全版）"""
     
-    # 刪除相關的Excel資料
-    db.query(ExcelData).filter(ExcelData.file_hash == 
-        db.query(FileUpload.file_hash).filter(FileUpload.id == file_id).scalar()
-    ).delete()
+    # 同步的資料庫檢查在執行緒中執行，不阻塞事件迴圈
+    await run_in_threadpool(check_file_deletable, db, file_id)
+    db.close()
     
-    # 刪除檔案記錄
-    file_upload = db.query(FileUpload).filter(FileUpload.id == file_id).first()
-    if not file_upload:
+    try:
+        result = await delete_pool.run(remove_files, [file_id])
+    except PoolSaturatedError:
+        raise pool_saturated_error()
+    if not result["deleted"]:
         raise HTTPException(status_code=404, detail="檔案不存在")
     
-    db.delete(file_upload)
-    db.commit()
+    return {"message": "檔案及相關資料已刪除", "rows_removed": result["rows_removed"]}
+
+@app.post("/files/delete/")
+async def delete_files(
+    body: BulkDeleteRequest,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    token: str = Depends(verify_token),
+    session: RateLimitDecision = Depends(check_rate_limit)
+):
+    """批次刪除多個檔案
+    
+    儲存格依索引分段刪除並逐段提交，不會長時間阻擋其他上傳。總儲存格數不超過
+    DELETE_SYNC_MAX_CELLS 時直接回傳刪除結果，否則回傳202與工作ID，
+    可透過 GET /files/delete/{job_id} 查詢進度。
+    """
     
-    return {"message": "檔案及相關資料已刪除"}
+    file_ids = list(dict.fromkeys(body.file_ids))
+    if not file_ids:
+        raise HTTPException(status_code=400, detail="file_ids 不能為空")
+    if len(file_ids) > MAX_DELETE_FILES:
+        raise HTTPException(status_code=400, detail=f"單次最多刪除 {MAX_DELETE_FILES} 個檔案")
+    
+    # 同步的資料庫檢查在執行緒中執行，不阻塞事件迴圈
+    cells_total = await run_in_threadpool(deletion_cells, db, file_ids)
+    db.close()
+    
+    if cells_total <= DELETE_SYNC_MAX_CELLS:
+        try:
+            return await delete_pool.run(remove_files, file_ids)
+        except PoolSaturatedError:
+            raise pool_saturated_error()
+    
+    job = DeleteJob(next(delete_job_ids), file_ids, cells_total)
+    try:
+        delete_pool.submit(remove_files, file_ids, job)
+    except PoolSaturatedError:
+        raise pool_saturated_error()
+    delete_jobs.add(job)
+    
+    status_url = f"/files/delete/{job.job_id}"
+    response.status_code = status.HTTP_202_ACCEPTED
+    response.headers["Location"] = status_url
+    return {
+        "status": "queued",
+        "message": "刪除工作已排入背景處理",
+        "job_id": job.job_id,
+        "file_ids": file_ids,
+        "cells_total": cells_total,
+        "status_url": status_url
+    }
+
+@app.get("/files/delete/{job_id}")
+async def get_delete_job(
+    job_id: int,
+    request: Request,
+    token: str = Depends(verify_token),
+    session: RateLimitDecision = Depends(check_rate_limit)
+):
+    """查詢批次刪除工作的進度"""
+    
+    job = delete_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="刪除工作不存在")
+    return job.snapshot()
+
+async def iter_export_batches(filename: Optional[str], sheet_name: Optional[str]):
+    """以獨立的非同步資料庫會話分批讀出匯出資料（回應送出期間持續讀取）"""
+    statement = select_cells()
+    if filename:
+        statement = statement.where(FileUpload.filename.contains(filename))
+    if sheet_name:
+        statement = statement.where(SheetName.name.contains(sheet_name))
+    
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(
+            statement.order_by(ExcelData.id),
+            execution_options={"yield_per": EXPORT_BATCH_SIZE}
+        )
+        async for partition in result.partitions():
+            # select_cells 的第一欄為id，其餘欄位順序與匯出欄位相同
+            yield [tuple(row)[1:] for row in partition]
 
 @app.get("/data/export/")
 async def export_data(
@@ -493,38 +2208,33 @@ async def export_data(
     filename: Optional[str] = None,
     sheet_name: Optional[str] = None,
     format: str = "json",
-    db: Session = Depends(get_db),
     token: str = Depends(verify_token),
-    session: UserSession = Depends(check_rate_limit)
+    session: RateLimitDecision = Depends(check_rate_limit)
 ):
-    """匯出資料（安全版）"""
+    """匯出資料（安全版）
     
-    query_obj = db.query(ExcelData)
+    以串流方式輸出，記憶體用量與匯出筆數無關。format 支援 json（與舊版相同的
+    {"data": [...]} 結構）、ndjson、csv，以及需要pyarrow的 parquet 與 arrow（IPC串流）。
+    """
     
-    if filename:
-        query_obj = query_obj.filter(ExcelData.filename.contains(filename))
-    if sheet_name:
-        query_obj = query_obj.filter(ExcelData.sheet_name.contains(sheet_name))
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="不支援的匯出格式")
+    if format in ARROW_FORMATS:
+        try:
+            require_pyarrow()
+        except RuntimeError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     
-    data = query_obj.all()
+    media_type, extension = EXPORT_FORMATS[format]
+    headers = {}
+    if format != "json":
+        headers["Content-Disposition"] = f'attachment; filename="export.{extension}"'
     
-    if format == "json":
-        return {
-            "data": [
-                {
-                    "filename": d.filename,
-                    "sheet_name": d.sheet_name,
-                    "row_number": d.row_number,
-                    "column_name": d.column_name,
-                    "cell_value": d.cell_value,
-                    "data_type": d.data_type,
-                    "upload_time": d.upload_time.isoformat()
-                }
-                for d in data
-            ]
-        }
-    else:
-        raise HTTPException(status_code=400, detail="不支援的匯出格式")
+    return StreamingResponse(
+        stream_export(iter_export_batches(filename, sheet_name), format),
+        media_type=media_type,
+        headers=headers
+    )
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,53 @@
+"""測試設定：以暫存目錄中的SQLite資料庫啟動API
+
+secure_main在匯入時讀取環境變數並建立資料表，因此環境變數必須在匯入前設定。
+設定TEST_DATABASE_URL（空的資料庫）可改以PostgreSQL執行。
+"""
+import io
+import os
+import sys
+import tempfile
+from typing import Dict
+
+import pandas as pd
+import pytest
+
+TEST_DIR = tempfile.mkdtemp(prefix="microalgae_api_test_")
+os.environ.update({
+    "DATABASE_URL": os.getenv("TEST_DATABASE_URL") or f"sqlite:///{TEST_DIR}/test.db",
+    "API_KEY": "test-api-key",
+    "ADMIN_API_KEY": "test-admin-key",
+    "ALLOWED_HOSTS": "testserver",
+    "RATE_LIMIT_REQUESTS": "1000000",
+    "UPLOAD_TMP_DIR": TEST_DIR,
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import secure_main  # noqa: E402
+
+AUTH = {"Authorization": "Bearer test-api-key"}
+ADMIN_AUTH = {"Authorization": "Bearer test-admin-key"}
+
+
+def workbook_bytes(sheets: Dict[str, pd.DataFrame]) -> bytes:
+    """將 {工作表名稱: DataFrame} 寫成xlsx內容"""
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, sheet_name=name, index=False)
+    return buffer.getvalue()
+
+
+def upload(client: TestClient, filename: str, sheets: Dict[str, pd.DataFrame], **params) -> dict:
+    """上傳工作簿並回傳回應內容（失敗時讓測試直接報錯）"""
+    response = client.post("/upload/", params=params, files={"file": (filename, workbook_bytes(sheets))}, headers=AUTH)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(secure_main.app) as test_client:
+        yield test_client
@@ -0,0 +1,72 @@
+"""串流讀取的分段方式（INGEST_CHUNK_ROWS）與上傳方式（單檔或批次）不影響寫入的儲存格"""
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+import secure_main
+from conftest import AUTH, upload, workbook_bytes
+
+ROWS = 30
+
+
+def mixed_log() -> pd.DataFrame:
+    """前段為整數、後段為小數的欄位，以及數字與文字混合的文字欄位"""
+    return pd.DataFrame({
+        "day": range(ROWS),
+        "od680": [i if i < 15 else i + 0.5 for i in range(ROWS)],
+        "strain": ["007" if i % 13 else f"CC-{i}" for i in range(ROWS)],
+        "sampled": [datetime(2024, 3, 1, 8) + timedelta(hours=i) for i in range(ROWS)],
+        "note": [None if i % 4 else i for i in range(ROWS)],
+    }, dtype=object)
+
+
+def stored_cells(client, filename: str) -> list:
+    response = client.get("/data/", params={"filename": filename, "sheet_name": "log", "match": "exact", "limit": 1000},
+                          headers=AUTH)
+    assert response.status_code == 200, response.text
+    return sorted((row["row_number"], row["column_name"], row["cell_value"], row["data_type"], row["value_num"])
+                  for row in response.json())
+
+
+@pytest.fixture(scope="module")
+def chunked_files(client):
+    original = secure_main.INGEST_CHUNK_ROWS
+    filenames = {}
+    try:
+        for chunk_rows in (0, 7, 1000):
+            secure_main.INGEST_CHUNK_ROWS = chunk_rows
+            filenames[chunk_rows] = f"chunked_{chunk_rows}.xlsx"
+            # 另一個工作表讓各檔案內容不同，避免被視為重複上傳
+            upload(client, filenames[chunk_rows], {"log": mixed_log(), "tag": pd.DataFrame({"chunk_rows": [chunk_rows]})})
+        # 工作表長於INGEST_CHUNK_ROWS時，批次上傳也以相同方式分段寫入
+        secure_main.INGEST_CHUNK_ROWS = 7
+        filenames["batch"] = "chunked_batch.xlsx"
+        content = workbook_bytes({"log": mixed_log(), "tag": pd.DataFrame({"chunk_rows": ["batch"]})})
+        response = client.post("/upload/batch/", files=[("files", (filenames["batch"], content))], headers=AUTH)
+        assert response.status_code == 200, response.text
+        assert response.json()["succeeded"] == 1
+    finally:
+        secure_main.INGEST_CHUNK_ROWS = original
+    return filenames
+
+
+def test_cells_independent_of_chunk_rows(client, chunked_files):
+    whole = stored_cells(client, chunked_files[0])
+    assert len(whole) == ROWS * 4 + ROWS // 4 + 1
+    for chunk_rows in (7, 1000):
+        assert stored_cells(client, chunked_files[chunk_rows]) == whole
+
+
+def test_batch_upload_stores_same_cells(client, chunked_files):
+    assert stored_cells(client, chunked_files["batch"]) == stored_cells(client, chunked_files[7])
+
+
+def test_cell_types_follow_each_value(client, chunked_files):
+    cells = {(row, column): (value, data_type) for row, column, value, data_type, _ in
+             stored_cells(client, chunked_files[7])}
+    assert cells[(1, "od680")] == ("0", "int")
+    assert cells[(16, "od680")] == ("15.5", "float")
+    assert cells[(2, "strain")] == ("007", "str")
+    assert cells[(14, "strain")] == ("CC-13", "str")
+    assert cells[(1, "sampled")] == ("2024-03-01 08:00:00", "Timestamp")
@@ -0,0 +1,41 @@
+"""分頁游標：依游標接續的結果與一次取回相同，格式或型別不符的游標回傳400"""
+import pandas as pd
+import pytest
+
+from conftest import AUTH, upload
+from secure_main import encode_cursor
+
+
+@pytest.fixture(scope="module")
+def cursor_file(client):
+    upload(client, "cursor_log.xlsx", {"log": pd.DataFrame({"day": range(30), "od680": [i / 10 for i in range(30)]})})
+
+
+def test_data_cursor_pages_match_single_query(client, cursor_file):
+    params = {"filename": "cursor_log.xlsx", "match": "exact"}
+    expected = client.get("/data/", params={**params, "limit": 1000}, headers=AUTH).json()
+    pages, cursor = [], None
+    while True:
+        response = client.get("/data/", params={**params, "limit": 7, **({"cursor": cursor} if cursor else {})}, headers=AUTH)
+        pages.extend(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert [row["id"] for row in pages] == [row["id"] for row in expected]
+
+
+@pytest.mark.parametrize("path, cursor", [
+    ("/data/", "not-base64!"),
+    ("/data/", encode_cursor(id="5")),
+    ("/data/", encode_cursor(id=True)),
+    ("/data/", encode_cursor(id=1.5)),
+    ("/data/", encode_cursor(id=2**70)),
+    ("/data/", encode_cursor(id=1, extra=2)),
+    ("/files/", encode_cursor(upload_time=123, id=1)),
+    ("/files/", encode_cursor(upload_time="2024-01-01T00:00:00", id="1")),
+    ("/files/", encode_cursor(upload_time="yesterday", id=1)),
+])
+def test_invalid_cursor_is_rejected(client, path, cursor):
+    response = client.get(path, params={"cursor": cursor}, headers=AUTH)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "無效的分頁游標"
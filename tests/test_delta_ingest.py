@@ -0,0 +1,79 @@
+"""增量上傳（ingest=delta）：各版本只保有變更的列，依雜湊值讀取時取整條版本鏈"""
+import pandas as pd
+
+import secure_main
+from conftest import AUTH, upload
+from secure_main import ExcelData, FileUpload, func
+
+
+def growth_log(days: int, strain: str, changed_day: int = -1) -> pd.DataFrame:
+    return pd.DataFrame({
+        "day": range(days),
+        "strain": [strain] * days,
+        "od680": [0.5 if i == changed_day else 0.2 + i * 0.05 for i in range(days)],
+    })
+
+
+def file_row(file_id: int) -> FileUpload:
+    db = secure_main.SessionLocal()
+    try:
+        return db.query(FileUpload).filter(FileUpload.id == file_id).one()
+    finally:
+        db.close()
+
+
+def stored_cell_count(filename: str) -> int:
+    db = secure_main.SessionLocal()
+    try:
+        return db.query(func.count(ExcelData.id)).join(FileUpload, FileUpload.id == ExcelData.file_id).filter(
+            FileUpload.filename == filename
+        ).scalar()
+    finally:
+        db.close()
+
+
+def sheet_rows(client, file_hash: str, sheet_name: str) -> list:
+    response = client.get("/data/sheet/", params={"file_hash": file_hash, "sheet_name": sheet_name}, headers=AUTH)
+    assert response.status_code == 200, response.text
+    return response.json()["rows"]
+
+
+def test_sheet_of_delta_version_has_all_rows(client):
+    upload(client, "delta_sheet.xlsx", {"log": growth_log(10, "CC-125")}, ingest="delta")
+    result = upload(client, "delta_sheet.xlsx", {"log": growth_log(10, "CC-125", changed_day=3)}, ingest="delta")
+    assert result["delta"]["rows_changed"] == 1
+    assert result["delta"]["rows_unchanged"] == 9
+
+    rows = sheet_rows(client, file_row(result["file_id"]).file_hash, "log")
+    assert len(rows) == 10
+    assert rows[3] == [4, 3, "CC-125", 0.5]
+
+    response = client.get("/data/", params={"file_hash": file_row(result["file_id"]).file_hash, "limit": 1000},
+                          headers=AUTH)
+    assert response.status_code == 200, response.text
+    assert len(response.json()) == 30
+
+
+def test_delta_after_full_upload_chains(client):
+    full = upload(client, "delta_full.xlsx", {"log": growth_log(10, "CC-503")})
+    result = upload(client, "delta_full.xlsx", {"log": growth_log(12, "CC-503")}, ingest="delta")
+    assert result["delta"]["previous_version_id"] == full["file_id"]
+    assert result["delta"]["lineage_id"] == full["file_id"]
+    assert result["delta"]["rows_added"] == 2
+    assert result["delta"]["rows_unchanged"] == 10
+    assert file_row(result["file_id"]).previous_version_id == full["file_id"]
+    # 未變更的列只保存一份
+    assert stored_cell_count("delta_full.xlsx") == 36
+
+
+def test_dropped_sheet_is_removed(client):
+    upload(client, "delta_drop.xlsx", {"log": growth_log(5, "UTEX 2714"), "notes": growth_log(3, "UTEX 2714")},
+           ingest="delta")
+    result = upload(client, "delta_drop.xlsx", {"log": growth_log(5, "UTEX 2714")}, ingest="delta")
+    assert result["delta"]["sheets_removed"] == ["notes"]
+    assert result["delta"]["rows_removed"] == 3
+    assert stored_cell_count("delta_drop.xlsx") == 15
+
+    response = client.get("/data/sheet/", params={"file_hash": file_row(result["file_id"]).file_hash,
+                                                  "sheet_name": "notes"}, headers=AUTH)
+    assert response.status_code == 404
@@ -0,0 +1,102 @@
+"""/data/ 的查詢計畫：常用的篩選條件都應以索引查詢excel_cells，不做全表掃描"""
+import pandas as pd
+import pytest
+
+import secure_main
+from conftest import upload
+
+sqlite_only = pytest.mark.skipif(secure_main.engine.dialect.name != "sqlite", reason="以SQLite的EXPLAIN QUERY PLAN檢查")
+
+FILTERS = [
+    {"filename": "plan_a"},
+    {"filename": "plan_a.xlsx", "match": "exact"},
+    {"sheet_name": "reactor_1", "match": "exact"},
+    {"sheet_name": "reactor"},
+    {"data_type": "float"},
+    {"data_type": "float", "sheet_name": "reactor_2"},
+    {"column_name": "ph"},
+    {"column_name": "ph", "filename": "plan_b"},
+    {"column_name": "ph", "match": "exact", "value_min": 7.0},
+]
+
+
+def culture_log(reactor: int, rows: int, seed: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "time": pd.date_range("2024-01-01", periods=rows, freq="h"),
+        "od680": [0.1 + i * 0.01 * reactor + seed for i in range(rows)],
+        "ph": [7.0 + (i % 10) / 10 for i in range(rows)],
+        "note": [f"r{reactor}-{i}" if i % 7 == 0 else None for i in range(rows)],
+    })
+
+
+@pytest.fixture(scope="module")
+def plan_files(client):
+    # 篩選條件只符合少數儲存格，統計資料才會讓規劃器在索引與全表掃描之間取捨
+    for seed, name in enumerate(("plan_a.xlsx", "plan_b.xlsx", "plan_c.xlsx", "plan_d.xlsx")):
+        sheets = {f"reactor_{reactor}": culture_log(reactor, 100, seed) for reactor in (1, 2)}
+        sheets.update({f"batch_{batch}": culture_log(batch, 100, seed) for batch in range(1, 5)})
+        upload(client, name, sheets)
+
+
+def query_plan(filters: dict) -> list:
+    db = secure_main.SessionLocal()
+    try:
+        statement = secure_main.data_statement(db, secure_main.DataQuery(**filters))
+        assert statement is not None
+        sql = str(statement.compile(secure_main.engine, compile_kwargs={"literal_binds": True}))
+        return [row[-1] for row in db.execute(secure_main.text(f"EXPLAIN QUERY PLAN {sql}"))]
+    finally:
+        db.close()
+
+
+def assert_indexed(filters: dict) -> list:
+    plan = query_plan(filters)
+    cells = [step for step in plan if "excel_cells" in step]
+    assert cells and all(step.startswith("SEARCH excel_cells USING") for step in cells), (filters, plan)
+    return plan
+
+
+@sqlite_only
+@pytest.mark.parametrize("filters", FILTERS)
+def test_filters_use_index(plan_files, filters):
+    assert_indexed(filters)
+
+
+@sqlite_only
+@pytest.mark.parametrize("filters", FILTERS)
+def test_filters_use_index_after_analyze(plan_files, filters):
+    # ANALYZE後規劃器會依統計資料選擇，篩選值少的欄位（工作表、型別）最容易退回全表掃描
+    with secure_main.engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    assert_indexed(filters)
+
+
+@sqlite_only
+@pytest.mark.parametrize("filters", [
+    {"filename": "plan_a.xlsx", "match": "exact"},
+    {"sheet_name": "reactor_1", "match": "exact"},
+    {"column_name": "ph", "match": "exact"},
+    {"data_type": "float"},
+    {"filename": "plan_b.xlsx", "column_name": "ph", "match": "exact"},
+])
+def test_single_valued_filters_need_no_sort(plan_files, filters):
+    # 以(篩選欄位, id)索引依id順序讀取，分頁不必先取出全部符合的儲存格再排序
+    plan = assert_indexed(filters)
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("reactor", {"reactor_1", "reactor_2"}),
+    ("Reactor", set()),
+    ("reactor_", {"reactor_1", "reactor_2"}),
+    ("reactor%", set()),
+    ("\U0010ffff", set()),
+])
+def test_prefix_match(plan_files, value, expected):
+    db = secure_main.SessionLocal()
+    try:
+        ids = secure_main.matching_ids(db, secure_main.SheetName, value, "prefix")
+        names = {row[0] for row in db.query(secure_main.SheetName.name).filter(secure_main.SheetName.id.in_(ids))} if ids else set()
+    finally:
+        db.close()
+    assert names == expected
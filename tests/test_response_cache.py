@@ -0,0 +1,34 @@
+"""回應快取的版本號保存在儲存後端：共用同一後端的多個ResponseCache（多個worker）同時失效"""
+from response_cache import MemoryCacheBackend, ResponseCache, cache_key
+
+
+def build(value):
+    return lambda: ({"value": value}, {})
+
+
+def test_invalidate_in_one_worker_is_seen_by_others():
+    backend = MemoryCacheBackend(maxsize=16)
+    worker_a, worker_b = ResponseCache(backend), ResponseCache(backend)
+    key = cache_key("stats")
+    
+    assert worker_a.get_or_build(key, build(1)).body == b'{"value":1}'
+    assert worker_b.get_or_build(key, build(2)).body == b'{"value":1}'
+    
+    worker_a.invalidate()
+    assert worker_b.get_or_build(key, build(3)).body == b'{"value":3}'
+    assert worker_a.get_or_build(key, build(4)).body == b'{"value":3}'
+    assert worker_a.stats()["version"] == worker_b.stats()["version"] == 1
+
+
+def test_result_built_before_invalidate_is_not_stored():
+    backend = MemoryCacheBackend(maxsize=16)
+    worker_a, worker_b = ResponseCache(backend), ResponseCache(backend)
+    key = cache_key("files", limit=10)
+    
+    # worker_a 查詢期間 worker_b 寫入資料並使快取失效，舊結果不可寫入快取
+    generation, cached = worker_a._lookup(key)
+    assert cached is None
+    worker_b.invalidate()
+    worker_a._store(key, generation, {"value": "stale"}, {})
+    
+    assert worker_b.get_or_build(key, build("fresh")).body == b'{"value":"fresh"}'
@@ -0,0 +1,68 @@
+"""sheet_stats在寫入與刪除時增量維護，結果應與由excel_cells重新計算相同"""
+import pandas as pd
+import pytest
+
+import secure_main
+from conftest import AUTH, upload, workbook_bytes
+from secure_main import ExcelData, SheetStat, func
+
+
+def growth_log(days: int, offset: float = 0.0) -> pd.DataFrame:
+    return pd.DataFrame({
+        "day": range(days),
+        "od680": [0.2 + i * 0.05 + offset for i in range(days)],
+        "note": ["harvest" if i % 5 == 4 else None for i in range(days)],
+    })
+
+
+def maintained_stats() -> dict:
+    db = secure_main.SessionLocal()
+    try:
+        return {(row.file_id, row.sheet_id): row.cell_count for row in db.query(SheetStat) if row.cell_count}
+    finally:
+        db.close()
+
+
+def recomputed_stats() -> dict:
+    db = secure_main.SessionLocal()
+    try:
+        rows = db.query(ExcelData.file_id, ExcelData.sheet_id, func.count(ExcelData.id)).group_by(
+            ExcelData.file_id, ExcelData.sheet_id
+        )
+        return {(file_id, sheet_id): count for file_id, sheet_id, count in rows}
+    finally:
+        db.close()
+
+
+@pytest.fixture(scope="module")
+def stats_files(client):
+    upload(client, "stats_single.xlsx", {"r1": growth_log(20), "r2": growth_log(12)})
+    batch = [
+        ("files", (f"stats_batch_{i}.xlsx", workbook_bytes({"r1": growth_log(8 + i, offset=i)})))
+        for i in range(3)
+    ]
+    response = client.post("/upload/batch/", files=batch, headers=AUTH)
+    assert response.status_code == 200, response.text
+    assert response.json()["succeeded"] == 3
+    upload(client, "stats_delta.xlsx", {"r1": growth_log(15), "r2": growth_log(6)}, ingest="delta")
+
+
+def test_stats_match_recompute_after_uploads(stats_files):
+    assert maintained_stats() == recomputed_stats()
+
+
+def test_stats_match_recompute_after_delta_changes(client, stats_files):
+    # 變更部分列、刪去一個工作表的尾端並新增列：舊版本被取代的列從其統計中扣除
+    changed = growth_log(18)
+    changed.loc[3:5, "od680"] = 9.9
+    delta = upload(client, "stats_delta.xlsx", {"r1": changed, "r2": growth_log(4)}, ingest="delta")["delta"]
+    assert delta["rows_added"] and delta["rows_changed"] and delta["rows_removed"]
+    assert maintained_stats() == recomputed_stats()
+
+
+def test_stats_match_recompute_after_delete(client, stats_files):
+    files = {f["filename"]: f["id"] for f in client.get("/files/", headers=AUTH).json()}
+    file_ids = [files["stats_single.xlsx"], files["stats_batch_1.xlsx"]]
+    response = client.post("/files/delete/", json={"file_ids": file_ids}, headers=AUTH)
+    assert response.status_code == 200, response.text
+    assert maintained_stats() == recomputed_stats()
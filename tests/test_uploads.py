@@ -0,0 +1,32 @@
+"""串流接收上傳：截斷的multipart內容回傳400且不留下暫存檔"""
+import os
+
+import pandas as pd
+import pytest
+
+from conftest import AUTH, TEST_DIR, workbook_bytes
+
+BOUNDARY = "upload-test-boundary"
+
+
+def multipart_body(field: str, filename: str, content: bytes) -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode() + content + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def temp_uploads() -> list:
+    return [name for name in os.listdir(TEST_DIR) if name.startswith("upload_")]
+
+
+@pytest.mark.parametrize("path, field", [("/upload/", "file"), ("/upload/batch/", "files")])
+def test_truncated_body_is_rejected(client, path, field):
+    content = workbook_bytes({"log": pd.DataFrame({"day": range(50)})})
+    body = multipart_body(field, "truncated.xlsx", content)
+    headers = {**AUTH, "Content-Type": f"multipart/form-data; boundary={BOUNDARY}"}
+    for cut in (len(body) // 2, len(body) - len(BOUNDARY) - 4):
+        response = client.post(path, content=body[:cut], headers=headers)
+        assert response.status_code == 400, response.text
+        assert temp_uploads() == []
@@ -0,0 +1,316 @@
+"""
+上傳檔案的串流接收
+
+上傳端點不使用FastAPI的File參數（那會在端點執行前先把整個multipart內容寫入
+SpooledTemporaryFile），而是直接讀取請求的串流：每收到一段內容即交給multipart
+解析器，檔案內容邊收邊檢查大小上限、增量計算SHA-256並寫入暫存檔，之後由
+讀取後端從檔案讀取。超過上限時立即中止，不再讀取其餘內容（沒有Content-Length的
+分段傳輸也一樣）。每個上傳佔用的記憶體只與區塊大小有關，與檔案大小無關，
+內容也只寫入磁碟一次。
+
+批次上傳的zip壓縮檔同樣以區塊解壓縮到各自的暫存檔，依實際解壓縮的大小
+（而非壓縮檔宣告的大小）檢查上限。
+"""
+
+import hashlib
+import logging
+import os
+import posixpath
+import tempfile
+import time
+import zipfile
+from typing import BinaryIO, Callable, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import Request
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from metrics import upload_stage_seconds
+
+logger = logging.getLogger(__name__)
+
+
+class UploadTooLargeError(Exception):
+    """上傳內容超過大小上限"""
+
+
+class StoredUpload:
+    """已寫入暫存檔的上傳內容"""
+
+    def __init__(self, path: str, size: int, file_hash: str):
+        self.path = path
+        self.size = size
+        self.file_hash = file_hash
+
+    def cleanup(self) -> None:
+        """刪除暫存檔（可重複呼叫）"""
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"無法刪除暫存檔 {self.path}: {str(e)}")
+
+
+class TooManyFilesError(Exception):
+    """上傳或壓縮檔內的檔案數超過上限"""
+
+
+class InvalidUploadError(Exception):
+    """請求不是有效的multipart/form-data"""
+
+
+class BatchEntry:
+    """批次上傳中的單一檔案：已寫入暫存檔，或無法接收時的錯誤原因"""
+
+    def __init__(self, filename: str, upload: Optional[StoredUpload] = None, error: Optional[str] = None):
+        self.filename = filename
+        self.upload = upload
+        self.error = error
+
+
+def _spool_stream(stream: BinaryIO, max_size: int, chunk_size: int,
+                  directory: Optional[str], suffix: str) -> StoredUpload:
+    hasher = hashlib.sha256()
+    size = 0
+    tmp = tempfile.NamedTemporaryFile(dir=directory, prefix="upload_", suffix=suffix, delete=False)
+    try:
+        with tmp:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLargeError(f"上傳內容超過 {max_size} bytes")
+                hasher.update(chunk)
+                tmp.write(chunk)
+    except BaseException:
+        os.unlink(tmp.name)
+        raise
+    return StoredUpload(tmp.name, size, hasher.hexdigest())
+
+
+def extract_archive(path: str, extensions: Iterable[str], max_files: int, max_size: int, max_total: int,
+                    chunk_size: int, directory: Optional[str] = None) -> List[BatchEntry]:
+    """將zip中副檔名符合的檔案逐一解壓縮到暫存檔（目錄與隱藏檔略過，不支援的格式記為錯誤）
+
+    單一檔案超過max_size時該檔記為錯誤；檔案數超過max_files時拋出TooManyFilesError，
+    合計超過max_total時拋出UploadTooLargeError（皆會先刪除已解壓縮的暫存檔）。
+    """
+    extensions = tuple(extensions)
+    entries: List[BatchEntry] = []
+    total = 0
+    try:
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                filename = posixpath.basename(info.filename)
+                if info.is_dir() or not filename or filename.startswith(".") or "__MACOSX/" in info.filename:
+                    continue
+                if len(entries) >= max_files:
+                    raise TooManyFilesError(f"壓縮檔內的檔案數超過 {max_files} 個")
+                suffix = os.path.splitext(filename)[1].lower()
+                if suffix not in extensions:
+                    entries.append(BatchEntry(filename, error="不支援的檔案格式"))
+                    continue
+                try:
+                    with archive.open(info) as member:
+                        upload = _spool_stream(member, min(max_size, max_total - total), chunk_size, directory, suffix)
+                except UploadTooLargeError:
+                    if total + max_size > max_total:
+                        raise UploadTooLargeError(f"壓縮檔解壓縮後超過 {max_total} bytes")
+                    entries.append(BatchEntry(filename, error="檔案大小超過限制"))
+                    continue
+                total += upload.size
+                entries.append(BatchEntry(filename, upload))
+    except BaseException:
+        for entry in entries:
+            if entry.upload:
+                entry.upload.cleanup()
+        raise
+    return entries
+
+
+class MultipartReceiver:
+    """multipart解析器的回呼：將指定欄位的檔案寫入各自的暫存檔
+
+    回呼在執行緒中隨parser.write執行（寫入暫存檔不阻塞事件迴圈）。
+    """
+
+    def __init__(self, field: str, max_file_size: int, max_total: int, max_files: int,
+                 directory: Optional[str], validate: Callable[[str], Optional[str]],
+                 unlimited_suffixes: Iterable[str], oversize_error: str):
+        self.field = field
+        self.max_file_size = max_file_size
+        self.max_total = max_total
+        self.max_files = max_files
+        self.directory = directory
+        self.validate = validate
+        self.unlimited_suffixes = tuple(unlimited_suffixes)
+        self.oversize_error = oversize_error
+        self.entries: List[BatchEntry] = []
+        self.total = 0
+        self.hash_seconds = 0.0
+        self._headers: dict = {}
+        self._header_name = b""
+        self._header_value = b""
+        self._entry: Optional[BatchEntry] = None
+        self._file = None
+        self._hasher = None
+        self._size = 0
+        self._limit = 0
+        self.finished = False
+
+    def on_part_begin(self) -> None:
+        self._headers = {}
+        self._entry = None
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self._headers[self._header_name.lower()] = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if options.get(b"name", b"").decode("utf-8", "replace") != self.field or b"filename" not in options:
+            return
+        if len(self.entries) >= self.max_files:
+            raise TooManyFilesError(f"上傳的檔案數超過 {self.max_files} 個")
+        filename = options[b"filename"].decode("utf-8", "replace")
+        self._entry = BatchEntry(filename, error=self.validate(filename))
+        self.entries.append(self._entry)
+        if self._entry.error is None:
+            suffix = os.path.splitext(filename)[1].lower()
+            self._limit = self.max_total if suffix in self.unlimited_suffixes else self.max_file_size
+            self._file = tempfile.NamedTemporaryFile(dir=self.directory, prefix="upload_", suffix=suffix, delete=False)
+            self._hasher = hashlib.sha256()
+            self._size = 0
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        # 所有part（包含略過的欄位）都計入總大小
+        self.total += end - start
+        if self.total > self.max_total:
+            raise UploadTooLargeError(f"上傳內容超過 {self.max_total} bytes")
+        if self._file is None:
+            return
+        self._size += end - start
+        if self._size > self._limit:
+            # 單一檔案過大：記為該檔的錯誤，其餘內容略過
+            self._discard_file()
+            self._entry.error = self.oversize_error
+            return
+        chunk = data[start:end]
+        hash_started = time.perf_counter()
+        self._hasher.update(chunk)
+        self.hash_seconds += time.perf_counter() - hash_started
+        self._file.write(chunk)
+
+    def on_part_end(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._entry.upload = StoredUpload(self._file.name, self._size, self._hasher.hexdigest())
+            self._file = None
+
+    def on_end(self) -> None:
+        # 收到結尾的boundary；請求內容被截斷時不會呼叫
+        self.finished = True
+
+    def _discard_file(self) -> None:
+        self._file.close()
+        os.unlink(self._file.name)
+        self._file = None
+
+    def cleanup(self) -> None:
+        """刪除寫到一半與已完成的暫存檔"""
+        if self._file is not None:
+            self._discard_file()
+        for entry in self.entries:
+            if entry.upload:
+                entry.upload.cleanup()
+
+
+async def receive_uploads(request: Request, field: str, max_file_size: int, max_total: int, max_files: int,
+                          chunk_size: int, directory: Optional[str] = None,
+                          validate: Callable[[str], Optional[str]] = lambda filename: None,
+                          unlimited_suffixes: Iterable[str] = (),
+                          oversize_error: str = "檔案大小超過限制") -> List[BatchEntry]:
+    """以串流解析multipart/form-data請求，將field欄位的檔案依序寫入暫存檔
+
+    validate(檔名)回傳錯誤訊息時該檔記為錯誤並略過內容；單一檔案超過max_file_size
+    （副檔名屬於unlimited_suffixes者只受max_total限制，例如zip）時記為該檔的錯誤oversize_error。
+    所有內容合計超過max_total時拋出UploadTooLargeError，檔案數超過max_files時拋出
+    TooManyFilesError，格式不符或內容不完整（缺少結尾的boundary）時拋出InvalidUploadError；
+    拋出前會刪除已寫入的暫存檔。
+    雜湊計算與接收/寫入的耗時分別記錄為hash與read_body階段。
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise InvalidUploadError("請以 multipart/form-data 上傳檔案")
+
+    receiver = MultipartReceiver(field, max_file_size, max_total, max_files, directory, validate,
+                                 unlimited_suffixes, oversize_error)
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": receiver.on_part_begin,
+        "on_header_field": receiver.on_header_field,
+        "on_header_value": receiver.on_header_value,
+        "on_header_end": receiver.on_header_end,
+        "on_headers_finished": receiver.on_headers_finished,
+        "on_part_data": receiver.on_part_data,
+        "on_part_end": receiver.on_part_end,
+        "on_end": receiver.on_end,
+    })
+    started = time.perf_counter()
+    try:
+        buffer = bytearray()
+        async for chunk in request.stream():
+            buffer += chunk
+            if len(buffer) >= chunk_size:
+                await run_in_threadpool(parser.write, bytes(buffer))
+                buffer.clear()
+        if buffer:
+            await run_in_threadpool(parser.write, bytes(buffer))
+        parser.finalize()
+        if not receiver.finished:
+            # finalize()不檢查結尾：截斷的內容會留下未完成的part與暫存檔
+            raise InvalidUploadError("multipart內容不完整")
+    except FormParserError:
+        receiver.cleanup()
+        raise InvalidUploadError("無效的multipart內容")
+    except BaseException:
+        receiver.cleanup()
+        raise
+    upload_stage_seconds.observe(receiver.hash_seconds, stage="hash")
+    upload_stage_seconds.observe(time.perf_counter() - started - receiver.hash_seconds, stage="read_body")
+    return receiver.entries
+
+
+class ContentLengthLimitMiddleware:
+    """上傳大小預檢（純ASGI中介層）：Content-Length已超過上限時不讀取內容，直接回傳413
+
+    limits為 {路徑: (上限bytes, 錯誤訊息)}，只檢查POST。沒有Content-Length的分段傳輸
+    由receive_uploads在串流接收時檢查。
+    """
+
+    def __init__(self, app: ASGIApp, limits: Dict[str, Tuple[int, str]]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" and scope["method"] == "POST" else None
+        if limit is not None:
+            max_length, detail = limit
+            content_length = Headers(scope=scope).get("content-length", "")
+            if content_length.isdigit() and int(content_length) > max_length:
+                await JSONResponse(status_code=413, content={"detail": detail})(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
@@ -0,0 +1,68 @@
+"""
+上傳處理用的有界工作執行緒池
+
+Excel解析與資料庫寫入皆為同步且耗時的工作，放在事件迴圈中執行會阻塞
+同一個worker上的所有請求（包含健康檢查）。此模組將工作交給固定大小的
+執行緒池，並限制同時執行加上排隊中的工作數量，超過上限時立即拒絕。
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class PoolSaturatedError(Exception):
+    """工作池已滿（執行中與排隊中的工作數量達到上限）"""
+
+
+class BoundedWorkerPool:
+    """固定執行緒數、佇列長度有限的工作池"""
+
+    def __init__(self, max_workers: int, max_queue: int, name: str = "worker"):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        """執行中加上排隊中的工作數量"""
+        return self._pending
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """送出工作；池已滿時拋出PoolSaturatedError而不等待"""
+        if not self._slots.acquire(blocking=False):
+            raise PoolSaturatedError(f"工作池已滿 ({self.max_workers} 執行中, {self.max_queue} 排隊中)")
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        # 名額在工作真正結束時才釋放，即使等待中的請求已被取消
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """在工作池中執行並等待結果，不阻塞事件迴圈（沿用呼叫端的contextvars）"""
+        context = contextvars.copy_context()
+        future = self.submit(context.run, functools.partial(fn, *args, **kwargs))
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self, wait: bool = True) -> None:
+        logger.info(f"關閉工作池，尚有 {self._pending} 個工作")
+        self._executor.shutdown(wait=wait)
+
+    def _release(self) -> None:
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()